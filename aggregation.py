@@ -0,0 +1,234 @@
+import heapq
+
+import numpy as np
+
+# Values at or below this are counted as zero by the quantile sketch
+MIN_SKETCH_VALUE = 1e-9
+
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        """
+        Streaming quantile estimate of non-negative values with a bounded relative error.
+
+        Values are counted in logarithmic buckets (as in DDSketch), so every quantile is
+        returned within `relative_accuracy` of a true value of the stream, whatever the number of
+        values added. Memory is bounded by `max_buckets`: past it, the lowest buckets are merged,
+        which only affects the accuracy of the smallest quantiles.
+
+        Parameters:
+        - relative_accuracy: Relative error of the returned quantiles.
+        - max_buckets: Largest number of buckets kept.
+        """
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.min_index = 0  # Bucket index of counts[0]
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, values):
+        """
+        Add an array of values to the sketch.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        if np.any(values < 0):
+            raise ValueError("QuantileSketch only supports non-negative values")
+        positive = values[values > MIN_SKETCH_VALUE]
+        self.zero_count += len(values) - len(positive)
+        self.count += len(values)
+        if not len(positive):
+            return
+        indices = np.ceil(np.log(positive) / self.log_gamma).astype(np.int64)
+        self._add_counts(int(indices.min()), np.bincount(indices - indices.min()))
+
+    def _add_counts(self, low, counts):
+        # Add bucket counts starting at bucket index `low`, extending and collapsing the range as needed
+        if not len(self.counts):
+            self.counts = counts.astype(np.int64)
+            self.min_index = low
+        else:
+            new_min = min(self.min_index, low)
+            new_max = max(self.min_index + len(self.counts), low + len(counts))
+            merged = np.zeros(new_max - new_min, dtype=np.int64)
+            merged[self.min_index - new_min:self.min_index - new_min + len(self.counts)] += self.counts
+            merged[low - new_min:low - new_min + len(counts)] += counts
+            self.counts = merged
+            self.min_index = new_min
+        if len(self.counts) > self.max_buckets:
+            excess = len(self.counts) - self.max_buckets
+            self.counts[excess] += self.counts[:excess].sum()
+            self.counts = self.counts[excess:].copy()
+            self.min_index += excess
+
+    def merge(self, other):
+        """
+        Add the values of another sketch with the same relative accuracy.
+        """
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(other.counts):
+            self._add_counts(other.min_index, other.counts)
+
+    def quantile(self, q):
+        """
+        Return the estimated `q`-quantile (0 <= q <= 1), or NaN for an empty sketch.
+        """
+        if not self.count:
+            return float('nan')
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank - self.zero_count, side='right'))
+        bucket = min(bucket, len(self.counts) - 1)
+        # Midpoint of the bucket in relative terms
+        return float(2 * self.gamma ** (self.min_index + bucket) / (self.gamma + 1))
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes
+
+
+class GridLoadAggregator:
+    def __init__(self, num_households, groups=None, num_groups=None, top_k=10, relative_accuracy=0.01,
+                 hours_per_day=24):
+        """
+        Streaming aggregation of per-household hourly usage into grid load statistics.
+
+        Rollouts call `add` once per simulated hour with the usage of every household. The
+        aggregator keeps running totals, the aggregate load curve, per-household totals, the
+        top-k peak hours and a quantile sketch of household hourly load. Memory grows with the
+        number of households plus the number of hours, never with their product.
+
+        Parameters:
+        - num_households: Number of households in every call to `add`.
+        - groups: Optional integer group of every household (e.g. house type), for per-group load curves.
+        - num_groups: Number of groups, by default one more than the largest group.
+        - top_k: Number of peak hours kept.
+        - relative_accuracy: Relative accuracy of the household load quantiles, see QuantileSketch.
+        - hours_per_day: Length of the daily load profile.
+        """
+        self.num_households = num_households
+        self.groups = None if groups is None else np.asarray(groups, dtype=np.int64)
+        if self.groups is not None and num_groups is None:
+            num_groups = int(self.groups.max()) + 1 if len(self.groups) else 0
+        self.num_groups = num_groups
+        self.top_k = top_k
+        self.hours_per_day = hours_per_day
+        self.hours = 0
+
+        self.totals = {'electricity': 0.0, 'gas': 0.0, 'cost': 0.0}
+        self.household_electricity = np.zeros(num_households)
+        self.household_gas = np.zeros(num_households)
+        self.daily_totals = np.zeros(hours_per_day)
+        self.daily_counts = np.zeros(hours_per_day, dtype=np.int64)
+        self.sketch = QuantileSketch(relative_accuracy)
+        self._peaks = []  # Min-heap of (load, -hour), so the earliest hour wins ties
+
+        # Hourly curves grow by doubling, one value per hour
+        self._curves = {name: np.zeros(1024) for name in ('electricity', 'gas', 'cost')}
+        self._group_curve = None if self.groups is None else np.zeros((1024, num_groups))
+
+    def add(self, electricity, gas=None, cost=None):
+        """
+        Consume the usage of every household for one hour.
+
+        Parameters:
+        - electricity: Array of shape (num_households,) with the electricity used (kWh).
+        - gas: Optional array of shape (num_households,) with the gas used (kWh).
+        - cost: Optional array of shape (num_households,) with the cost of the hour (£).
+        """
+        electricity = np.asarray(electricity, dtype=np.float64)
+        hour = self.hours
+        if hour == len(self._curves['electricity']):
+            self._grow()
+
+        load = float(electricity.sum())
+        self._curves['electricity'][hour] = load
+        self.totals['electricity'] += load
+        self.household_electricity += electricity
+        if gas is not None:
+            gas_load = float(np.sum(gas))
+            self._curves['gas'][hour] = gas_load
+            self.totals['gas'] += gas_load
+            self.household_gas += gas
+        if cost is not None:
+            hour_cost = float(np.sum(cost))
+            self._curves['cost'][hour] = hour_cost
+            self.totals['cost'] += hour_cost
+        if self.groups is not None:
+            self._group_curve[hour] = np.bincount(self.groups, weights=electricity, minlength=self.num_groups)
+
+        self.daily_totals[hour % self.hours_per_day] += load
+        self.daily_counts[hour % self.hours_per_day] += 1
+        self.sketch.add(electricity)
+
+        if len(self._peaks) < self.top_k:
+            heapq.heappush(self._peaks, (load, -hour))
+        elif load > self._peaks[0][0]:
+            heapq.heapreplace(self._peaks, (load, -hour))
+        self.hours += 1
+
+    def _grow(self):
+        for name, curve in self._curves.items():
+            self._curves[name] = np.concatenate([curve, np.zeros_like(curve)])
+        if self._group_curve is not None:
+            self._group_curve = np.concatenate([self._group_curve, np.zeros_like(self._group_curve)])
+
+    def load_curve(self, field='electricity'):
+        """
+        Return the aggregate hourly curve of 'electricity', 'gas' or 'cost', shape (hours,).
+        """
+        return self._curves[field][:self.hours].copy()
+
+    def group_load_curve(self):
+        """
+        Return the hourly electricity load of every group, shape (hours, num_groups).
+        """
+        if self._group_curve is None:
+            raise ValueError("The aggregator was created without household groups")
+        return self._group_curve[:self.hours].copy()
+
+    def daily_profile(self):
+        """
+        Return the mean aggregate electricity load of every hour of the day.
+        """
+        return self.daily_totals / np.maximum(self.daily_counts, 1)
+
+    def peaks(self):
+        """
+        Return the top-k peak hours as a list of (hour, load), highest load first.
+        """
+        return [(-hour, load) for load, hour in sorted(self._peaks, reverse=True)]
+
+    def quantile(self, q):
+        """
+        Return the estimated `q`-quantile of household hourly electricity load.
+        """
+        return self.sketch.quantile(q)
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99)):
+        peaks = self.peaks()
+        return {
+            'households': self.num_households,
+            'hours': self.hours,
+            'total_electricity': self.totals['electricity'],
+            'total_gas': self.totals['gas'],
+            'total_cost': self.totals['cost'],
+            'peak_hour': peaks[0][0] if peaks else None,
+            'peak_load': peaks[0][1] if peaks else None,
+            'mean_load': self.totals['electricity'] / max(self.hours, 1),
+            'household_load_quantiles': {q: self.quantile(q) for q in quantiles},
+        }
+
+    @property
+    def nbytes(self):
+        curves = sum(curve.nbytes for curve in self._curves.values())
+        if self._group_curve is not None:
+            curves += self._group_curve.nbytes
+        return (curves + self.household_electricity.nbytes + self.household_gas.nbytes + self.daily_totals.nbytes +
+                self.sketch.nbytes)
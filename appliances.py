@@ -0,0 +1,37 @@
+# Seasons of the environment, in the order of the 'season' feature and of the collected season codes
+SEASONS = ['winter', 'summer']
+
+# Gas price (pence per kWh)
+GAS_PRICE = 10.00
+
+# Length of a simulated season, one environment episode
+SEASON_DAYS = 90
+NUM_HOURS = SEASON_DAYS * 24
+
+# Hourly usage (kWh) of every appliance by season
+SEASONAL_APPLIANCE_USAGE = {
+    'winter': {
+        'washing_machine': 0.12,
+        'fridge': 0.10,
+        'lighting': 0.08,
+        'heating': 0.30,
+        'gas_heating': 0.5,
+        'gas_cooking': 0.5,
+    },
+    'summer': {
+        'washing_machine': 0.10,
+        'fridge': 0.12,
+        'lighting': 0.05,
+        'cooling': 0.10,
+        'gas_cooking': 0.8,
+    },
+}
+
+
+def appliance_usage(season):
+    '''
+        Return a copy of the appliance usage table of a season
+    '''
+    if season not in SEASONAL_APPLIANCE_USAGE:
+        raise ValueError(f"Season must be one of {SEASONS}")
+    return dict(SEASONAL_APPLIANCE_USAGE[season])
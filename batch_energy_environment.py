@@ -0,0 +1,138 @@
+import numpy as np
+
+from appliances import GAS_PRICE, SEASON_DAYS, appliance_usage
+from observations import encode, state_size
+from tariff import OFF_PEAK_PRICE, PEAK_PRICE, two_rate_tariff
+
+
+class BatchEnergyEnvironment:
+    def __init__(self, num_envs, num_rooms=1, season='winter', tariff=None, features=(), num_people=2,
+                 usage_scale=1.0):
+        """
+        Step many households of the EnergyEnvironment at once.
+
+        Every household keeps its own state, hour and day in NumPy arrays, so one call to `step`
+        advances all of them and gives the same rewards as calling `EnergyEnvironment.step` on
+        each household separately.
+
+        Parameters:
+        - num_envs: Number of households simulated side by side.
+        - num_rooms: Number of rooms, either a single value shared by every household or one
+          value per household.
+        - season: 'winter' or 'summer', shared by every household in the batch.
+        - tariff: Electricity Tariff shared by every household, the two-rate tariff by default.
+        - features: Observation features appended to the state, see observations.FEATURE_SIZES.
+        - num_people: Occupancy, either a single value or one value per household.
+        - usage_scale: Factor applied to the electricity and gas used, either a single value or
+          one value per household, for example ENERGY_SAVING_FACTOR for energy saving households.
+        """
+        self.num_envs = num_envs
+        self.season = season
+        self.num_rooms = np.broadcast_to(np.asarray(num_rooms, dtype=np.float64), (num_envs,)).copy()
+        self.num_people = np.broadcast_to(np.asarray(num_people, dtype=np.int64), (num_envs,)).copy()
+        self.usage_scale = np.broadcast_to(np.asarray(usage_scale, dtype=np.float64), (num_envs,)).copy()
+        self.features = tuple(features)
+        self.state_size = state_size(self.features)
+
+        # Same prices and appliance table as EnergyEnvironment, without importing gym
+        self.peak_price = PEAK_PRICE
+        self.off_peak_price = OFF_PEAK_PRICE
+        self.gas_price = GAS_PRICE
+        self.appliance_usage = appliance_usage(season)
+        self.tariff = tariff or two_rate_tariff(self.peak_price, self.off_peak_price)
+
+        self.state = np.zeros((num_envs, 5), dtype=np.int64)
+        self.current_hour = np.zeros(num_envs, dtype=np.int64)
+        self.current_day = np.zeros(num_envs, dtype=np.int64)
+
+        self._build_tables()
+        self.reset()
+
+    def _build_tables(self):
+        # Per-household coefficient of each appliance, kept in the same order of operations as
+        # EnergyEnvironment.step so both environments produce identical floating point results
+        usage = self.appliance_usage
+        self.lighting_coef = 0.5 * self.num_rooms * usage['lighting']
+        self.washing_machine_coef = 1.5 * usage['washing_machine']
+        self.fridge_usage = 1 * usage['fridge']
+        self.climate_usage = 0.0
+        if 'heating' in usage:
+            self.climate_usage += 2 * usage['heating']
+        if 'cooling' in usage:
+            self.climate_usage += 1 * usage['cooling']
+        self.gas_heating_coef = 3 * usage.get('gas_heating', 0)
+        self.gas_cooking_coef = 2 * usage.get('gas_cooking', 0)
+
+    def reset(self, indices=None):
+        """
+        Reset all households, or only the ones listed in `indices`, to the initial state.
+
+        Returns:
+        - Array of shape (num_envs, len(state_size)) with the current observation of every household.
+        """
+        if indices is None:
+            indices = slice(None)
+        self.state[indices] = [0, 0, 1, 0, 0]
+        self.current_hour[indices] = 0
+        self.current_day[indices] = 0
+        return self._observation()
+
+    def step(self, actions):
+        """
+        Apply one action per household and advance every household by one hour.
+
+        Parameters:
+        - actions: Integer array of shape (num_envs, 5) holding
+          (light, washing_machine, fridge, gas_heating, gas_cooking) for each household.
+
+        Returns:
+        - Tuple (next_states, rewards, dones, info) where next_states has shape
+          (num_envs, len(state_size)),
+          rewards and dones have shape (num_envs,) and info holds the per-household
+          electricity_used, gas_used, electricity_cost and gas_cost of the step.
+        """
+        actions = np.asarray(actions)
+        light = actions[:, 0]
+        washing_machine = actions[:, 1]
+        gas_heating = actions[:, 3]
+        gas_cooking = actions[:, 4]
+
+        electricity_used = (
+            light * self.lighting_coef +
+            washing_machine * self.washing_machine_coef +
+            self.fridge_usage
+        )
+        electricity_used += self.climate_usage
+        electricity_used *= self.usage_scale
+
+        gas_used = (
+            gas_heating * self.gas_heating_coef +
+            gas_cooking * self.gas_cooking_coef
+        ) * self.usage_scale
+
+        electricity_price = self.tariff.price_at(self.current_day, self.current_hour)
+        gas_price = self.gas_price / 100
+        electricity_cost = electricity_used * electricity_price
+        gas_cost = gas_used * gas_price
+        rewards = -(electricity_cost + gas_cost)
+
+        self.state[:] = actions
+        self.state[:, 2] = 1  # Fridge is always on
+
+        self.current_hour += 1
+        rollover = self.current_hour >= 24
+        self.current_hour[rollover] = 0
+        self.current_day[rollover] += 1
+        dones = self.current_day >= SEASON_DAYS
+
+        info = {
+            'electricity_used': electricity_used,
+            'gas_used': gas_used,
+            'electricity_cost': electricity_cost,
+            'gas_cost': gas_cost,
+        }
+        return self._observation(), rewards, dones, info
+
+    def _observation(self):
+        return encode(self.state.copy(), self.features, self.season, self.current_hour, self.current_day,
+                      self.num_people, self.num_rooms.astype(np.int64))
@@ -0,0 +1,305 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Every benchmark runs in its own process and imports only what it measures (gym, mesa,
+# matplotlib, ...), so that its peak RSS is not dominated by the imports of the others
+
+# Relative throughput drop tolerated by the regression check
+DEFAULT_TOLERANCE = 0.2
+
+# Import time budget (seconds, fresh interpreter) of the modules that short jobs start from
+IMPORT_BUDGET_SECONDS = {
+    'cli': 0.05,
+    'main': 0.3,
+    'evaluation': 0.3,
+}
+
+
+def peak_rss_mb():
+    # Peak RSS of the whole process so far, ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return time.perf_counter() - start
+
+
+def bench_env_step(quick):
+    from energy_environment import EnergyEnvironment
+
+    steps = 2000 if quick else 20000
+    env = EnergyEnvironment(num_rooms=3, season='winter')
+    env.reset()
+    action = [1, 0, 1, 1, 0]
+
+    def step():
+        if env.step(action)[2]:
+            env.reset()
+
+    seconds = _timed(step, steps)
+    return {'steps_per_sec': steps / seconds}
+
+
+def bench_batch_env_step(quick):
+    from batch_energy_environment import BatchEnergyEnvironment
+
+    num_envs = 1024
+    steps = 200 if quick else 2000
+    env = BatchEnergyEnvironment(num_envs, num_rooms=3, season='winter')
+    actions = np.random.default_rng(0).integers(0, 2, (num_envs, 5))
+    seconds = _timed(lambda: env.step(actions), steps)
+    return {'steps_per_sec': steps * num_envs / seconds}
+
+
+def bench_agent(quick):
+    from observations import ACTION_STATE_SIZE
+    from q_learning_agent import QLearningAgent
+
+    steps = 2000 if quick else 20000
+    agent = QLearningAgent(ACTION_STATE_SIZE, ACTION_STATE_SIZE, rng=0)
+    state = [0, 0, 1, 0, 0]
+    action = agent.choose_action(state)
+
+    choose_seconds = _timed(lambda: agent.choose_action(state), steps)
+    learn_seconds = _timed(lambda: agent.learn(state, action, -1.0, state), steps)
+
+    num_envs = 1024
+    states = np.zeros((num_envs, 5), dtype=np.int64)
+    actions = agent.choose_actions(states)
+    rewards = -np.ones(num_envs)
+    batch_steps = steps // 20
+    batch_seconds = _timed(lambda: agent.learn_batch(states, actions, rewards, states), batch_steps)
+
+    return {
+        'choose_action_per_sec': steps / choose_seconds,
+        'updates_per_sec': steps / learn_seconds,
+        'batched_updates_per_sec': batch_steps * num_envs / batch_seconds,
+    }
+
+
+def bench_train_episode(quick):
+    from main import EnergyModel, EPISODE_STEPS
+
+    model = EnergyModel(0, 3, 'winter', seed=0)
+    sequential_seconds = _timed(lambda: model.train_agent(1), 1)
+
+    num_envs = 64 if quick else 256
+    batched_seconds = _timed(lambda: model.train_agent_batched(num_envs, num_envs), 1)
+    return {
+        'episode_seconds': sequential_seconds,
+        'steps_per_sec': EPISODE_STEPS / sequential_seconds,
+        'batched_steps_per_sec': num_envs * EPISODE_STEPS / batched_seconds,
+    }
+
+
+def bench_household_step(quick):
+    from models.model import HouseholdEnergyModel
+    from models.population import HouseholdPopulation
+
+    results = {}
+    sizes = [100, 1000] if quick else [100, 1000, 10000]
+    for size in sizes:
+        mesa_model = HouseholdEnergyModel(size, 'winter', rng=0)
+        seconds = _timed(mesa_model.step, 3)
+        results[f'mesa_{size}_agent_steps_per_sec'] = 3 * size / seconds
+
+        population = HouseholdPopulation(size, 'winter', rng=0)
+        seconds = _timed(population.step, 10)
+        results[f'population_{size}_agent_steps_per_sec'] = 10 * size / seconds
+    return results
+
+
+def bench_graphs(quick):
+    from graph_generator import GraphRenderer, generate_comparison_graphs
+
+    repeat = 2 if quick else 5
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            seconds = _timed(lambda: generate_comparison_graphs('winter', 1500, 10, 350, 1800, 2700, 700,
+                                                                show=False), repeat)
+        finally:
+            os.chdir(working_directory)
+
+        # Sweep-sized batch rendered into one multi-page PDF
+        results = [{'season': 'winter', 'num_rooms': 3, 'seed': i, 'electricity_trained': 1500 + i, 'gas_trained': 10,
+                    'cost_trained': 350, 'electricity_random': 1800, 'gas_random': 2700, 'cost_random': 700}
+                   for i in range(10 if quick else 50)]
+        batch_seconds = _timed(lambda: GraphRenderer().render_comparisons(results, os.path.join(directory, 'sweep.pdf')),
+                               1)
+    return {'graphs_per_sec': repeat / seconds, 'batch_graphs_per_sec': len(results) / batch_seconds}
+
+
+def bench_time_to_target(quick):
+    # Wall time of batched training until the greedy policy is within 1% of the optimal cost
+    from main import EnergyModel
+
+    reference = EnergyModel(0, 3, 'winter')
+    reference.solve_agent()
+    target_cost = reference.test_agent_exploitation()[2] * 1.01
+
+    model = EnergyModel(0, 3, 'winter', seed=0)
+    chunk = 64
+    max_episodes = 256 if quick else 4096
+    episodes = 0
+    cost = float('inf')
+    start = time.perf_counter()
+    while episodes < max_episodes and cost > target_cost:
+        model.train_agent_batched(chunk, chunk)
+        episodes += chunk
+        cost = model.test_agent_exploitation()[2]
+    seconds = time.perf_counter() - start
+
+    return {
+        'target_cost': target_cost,
+        'reached_cost': cost,
+        'reached_target': cost <= target_cost,
+        'episodes_to_target': episodes,
+        'seconds_to_target': seconds,
+    }
+
+
+def import_seconds(module):
+    # Import time of `module` in a fresh interpreter, the best of three runs
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return min(float(subprocess.run([sys.executable, '-c', code], cwd=directory, capture_output=True, text=True,
+                                    check=True).stdout) for _ in range(3))
+
+
+def bench_startup(quick):
+    results = {}
+    for module, budget in IMPORT_BUDGET_SECONDS.items():
+        seconds = import_seconds(module)
+        results[f'import_{module}_seconds'] = seconds
+        results[f'import_{module}_over_budget'] = seconds > budget
+    return results
+
+
+BENCHMARKS = {
+    'env_step': bench_env_step,
+    'batch_env_step': bench_batch_env_step,
+    'agent': bench_agent,
+    'train_episode': bench_train_episode,
+    'household_step': bench_household_step,
+    'graphs': bench_graphs,
+    'time_to_target': bench_time_to_target,
+    'startup': bench_startup,
+}
+
+
+def _run_benchmark(name, quick):
+    start = time.perf_counter()
+    metrics = BENCHMARKS[name](quick)
+    metrics['wall_seconds'] = time.perf_counter() - start
+    metrics['peak_rss_mb'] = peak_rss_mb()
+    return metrics
+
+
+def run_benchmarks(names=None, quick=False):
+    """
+    Run the selected benchmarks (all by default), each in a fresh process so that its peak RSS
+    is its own and not the running maximum of the benchmarks before it.
+
+    Returns:
+    - Dict with the environment description and, for every benchmark, its metrics, wall time and
+      peak RSS.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for name in names or BENCHMARKS:
+        print(f"Running {name}...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[name] = executor.submit(_run_benchmark, name, quick).result()
+
+    return {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'quick': quick,
+        'results': results,
+    }
+
+
+def find_regressions(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare every throughput metric (names ending in 'per_sec') against a baseline run.
+
+    Returns:
+    - List of (benchmark, metric, baseline value, current value) for every metric that dropped by
+      more than `tolerance`.
+    """
+    regressions = []
+    for name, metrics in current['results'].items():
+        baseline_metrics = baseline['results'].get(name, {})
+        for metric, value in metrics.items():
+            if not metric.endswith('per_sec') or metric not in baseline_metrics:
+                continue
+            if value < baseline_metrics[metric] * (1 - tolerance):
+                regressions.append((name, metric, baseline_metrics[metric], value))
+    return regressions
+
+
+def find_budget_overruns(current):
+    """
+    Return (benchmark, metric) for every import that took longer than IMPORT_BUDGET_SECONDS.
+    """
+    return [(name, metric) for name, metrics in current['results'].items() for metric, value in metrics.items()
+            if metric.endswith('_over_budget') and value]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Measure training and simulation throughput.')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Benchmarks to run')
+    parser.add_argument('--quick', action='store_true', help='Use smaller workloads')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='Fail when throughput dropped compared to this results file')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmarks(args.only, quick=args.quick)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name, metrics in report['results'].items():
+        print(f"\n{name}")
+        for metric, value in metrics.items():
+            print(f"  {metric}: {value:.4g}" if isinstance(value, float) else f"  {metric}: {value}")
+
+    overruns = find_budget_overruns(report)
+    for name, metric in overruns:
+        module = metric[len('import_'):-len('_over_budget')]
+        print(f"OVER BUDGET {name}.{metric}: import {module} took longer than {IMPORT_BUDGET_SECONDS[module]}s")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(report, baseline, args.tolerance)
+        for name, metric, expected, value in regressions:
+            print(f"REGRESSION {name}.{metric}: {value:.4g} < {expected:.4g} (tolerance {args.tolerance:.0%})")
+    return 1 if overruns or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+def config_key(config):
+    """
+    Return a short stable hash of a scenario config dict.
+    """
+    encoded = json.dumps(config, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class CheckpointStore:
+    def __init__(self, root):
+        """
+        Directory of Q-table checkpoints keyed by a hash of their scenario config.
+
+        Every checkpoint is a pair of files: `<key>.npy` with the Q-table and `<key>.json` with the
+        config and the training metadata (episodes completed, training steps, the decayed alpha and
+        epsilon, whether training finished). Files are written to a unique temporary file first and
+        then renamed, so readers never see a partial checkpoint, even with several processes saving
+        to the same store.
+
+        Parameters:
+        - root: Directory holding the checkpoints, created if needed.
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _paths(self, config):
+        key = config_key(config)
+        return os.path.join(self.root, f"{key}.npy"), os.path.join(self.root, f"{key}.json")
+
+    def save(self, config, q_table, episodes_completed, training_steps, complete=True, alpha=None, epsilon=None):
+        """
+        Save a Q-table with its config and training metadata.
+
+        Parameters:
+        - config: Scenario config dict, see EnergyModel.scenario_config.
+        - q_table: The Q-table to save.
+        - episodes_completed: Number of training episodes that produced this Q-table.
+        - training_steps: Number of environment steps that produced this Q-table.
+        - complete: False for periodic checkpoints taken while training is still running.
+        - alpha, epsilon: The agent's learning rate and exploration rate at this point of training,
+          so a resumed run continues their decay instead of restarting it.
+        """
+        q_table_path, metadata_path = self._paths(config)
+        metadata = {
+            'key': config_key(config),
+            'config': config,
+            'episodes_completed': int(episodes_completed),
+            'training_steps': int(training_steps),
+            'complete': complete,
+            'saved_at': time.time(),
+            'shape': list(q_table.shape),
+        }
+        if alpha is not None:
+            metadata['alpha'] = float(alpha)
+        if epsilon is not None:
+            metadata['epsilon'] = float(epsilon)
+
+        temporary_path = self._temporary_path(metadata['key'])
+        with open(temporary_path, 'wb') as f:
+            np.save(f, q_table)
+        os.replace(temporary_path, q_table_path)
+
+        temporary_path = self._temporary_path(metadata['key'])
+        with open(temporary_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(temporary_path, metadata_path)
+
+    def _temporary_path(self, key):
+        # Every writer gets its own file, so concurrent saves of the same key never mix their data
+        handle, path = tempfile.mkstemp(prefix=f"{key}.", suffix='.tmp', dir=self.root)
+        os.close(handle)
+        return path
+
+    @contextmanager
+    def lock(self, config):
+        """
+        Hold an exclusive lock on the checkpoint of `config` across processes, so that only one
+        of them trains a scenario while the others wait and then load its result.
+        """
+        lock_path = os.path.join(self.root, f"{config_key(config)}.lock")
+        with open(lock_path, 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def metadata(self, config):
+        """
+        Return the metadata dict of the checkpoint for `config`, or None when there is none.
+        """
+        _, metadata_path = self._paths(config)
+        if not os.path.exists(metadata_path):
+            return None
+        with open(metadata_path) as f:
+            return json.load(f)
+
+    def load(self, config, mmap_mode=None):
+        """
+        Load the checkpoint for `config`.
+
+        Parameters:
+        - config: Scenario config dict.
+        - mmap_mode: Passed to np.load, use 'r' to share one read-only copy of the Q-table between
+          many evaluation processes.
+
+        Returns:
+        - Tuple (q_table, metadata), or None when there is no checkpoint for `config`.
+        """
+        metadata = self.metadata(config)
+        if metadata is None:
+            return None
+        q_table_path, _ = self._paths(config)
+        return np.load(q_table_path, mmap_mode=mmap_mode), metadata
+
+    def has_complete(self, config):
+        """
+        Return True when a finished training run for `config` is stored.
+        """
+        metadata = self.metadata(config)
+        return metadata is not None and metadata['complete']
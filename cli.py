@@ -0,0 +1,194 @@
+import argparse
+import sys
+
+from appliances import NUM_HOURS, SEASONS
+
+# Modules are imported inside the commands that need them, so `--help` and short jobs only pay
+# for what they use. Startup time is tracked by the 'startup' benchmark in benchmark.py.
+
+
+def _add_scenario_arguments(parser):
+    parser.add_argument('--season', choices=SEASONS, default='winter')
+    parser.add_argument('--num-rooms', type=int, default=3)
+    parser.add_argument('--alpha', type=float, default=0.1)
+    parser.add_argument('--gamma', type=float, default=0.95)
+    parser.add_argument('--epsilon', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def _energy_model(args):
+    from main import EnergyModel
+
+    # No household population is needed to train or evaluate the agent, and it is built lazily anyway
+    return EnergyModel(0, args.num_rooms, args.season, alpha=args.alpha, gamma=args.gamma, epsilon=args.epsilon,
+                       seed=args.seed)
+
+
+def train(args):
+    model = _energy_model(args)
+    store = None
+    if args.checkpoints:
+        from checkpoint import CheckpointStore
+
+        store = CheckpointStore(args.checkpoints)
+
+    options = {}
+    if args.early_stopping:
+        from convergence import ConvergenceCriterion, DecaySchedule
+
+        options = {'convergence': ConvergenceCriterion(tolerance=5e-3), 'alpha_schedule': DecaySchedule(0.995, 0.01)}
+    report = model.train_agent(args.episodes, num_envs=args.num_envs, store=store, **options)
+    model.q_learning_agent.save_q_table(args.output)
+    print(f"{report}, Q-table saved to {args.output}")
+    return 0
+
+
+def evaluate(args):
+    model = _energy_model(args)
+    if args.exact:
+        model.solve_agent()
+    else:
+        model.q_learning_agent.load_q_table(args.q_table, mmap_mode='r')
+
+    results = model.evaluate(seeds=tuple(args.seeds) if args.seeds else None)
+    for name, result in results.items():
+        line = (f"{name:>8}: electricity {result.mean('electricity'):.2f} kWh, gas {result.mean('gas'):.2f} kWh, "
+                f"cost £{result.mean('cost'):.2f}")
+        if len(result.seeds) > 1:
+            low, high = result.confidence_interval('cost')
+            line += f" (95% CI £{low:.2f} - £{high:.2f})"
+        print(line)
+    return 0
+
+
+def sweep(argv):
+    import sweep as sweep_module
+
+    return sweep_module.main(argv) or 0
+
+
+def plot(args):
+    import csv
+
+    from graph_generator import GraphRenderer
+
+    with open(args.results, newline='') as f:
+        results = list(csv.DictReader(f))
+    for result in results:
+        for field, value in result.items():
+            if field.endswith(('_trained', '_random')) or field in ('alpha', 'gamma', 'epsilon'):
+                result[field] = float(value)
+
+    renderer = GraphRenderer()
+    if args.grid:
+        files = renderer.render_grid(results, args.output, rows=args.rows, columns=args.columns)
+    else:
+        files = renderer.render_comparisons(results, args.output)
+    print(f"Rendered {len(results)} results to {len(files)} file(s) in {args.output}")
+    return 0
+
+
+def simulate_population(args):
+    from main import EnergyModel
+
+    model = EnergyModel(args.num_households, 3, args.season, seed=args.seed,
+                        vectorized_population=args.vectorized)
+    _, demand = model.control_households(args.episodes, per_house_type=args.per_house_type,
+                                         agent_type=args.agent_type, hours=args.hours)
+
+    summary = demand.aggregator.summary()
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    if args.plot:
+        from graph_generator import GraphRenderer
+
+        GraphRenderer().render_load_curves({f'{args.season.capitalize()} neighbourhood load': demand}, args.plot)
+    return 0
+
+
+def serve(args):
+    import asyncio
+
+    from service import ScenarioService
+
+    service = ScenarioService(cache_dir=args.cache_dir, max_workers=args.workers, max_pending=args.max_pending,
+                              checkpoint_dir=args.checkpoints)
+    print(f"Serving scenario requests on {args.host}:{args.port}")
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Household energy Q-learning experiments.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = commands.add_parser('train', help='Train the Q-learning agent of one scenario')
+    _add_scenario_arguments(train_parser)
+    train_parser.add_argument('--episodes', type=int, default=2000)
+    train_parser.add_argument('--num-envs', type=int, default=64)
+    train_parser.add_argument('--checkpoints', help='CheckpointStore directory to resume from and save to')
+    train_parser.add_argument('--no-early-stopping', dest='early_stopping', action='store_false')
+    train_parser.add_argument('--output', default='q_table.npy')
+    train_parser.set_defaults(function=train)
+
+    evaluate_parser = commands.add_parser('evaluate', help='Evaluate a trained agent against a random policy')
+    _add_scenario_arguments(evaluate_parser)
+    source = evaluate_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--q-table', help='Q-table saved by the train command')
+    source.add_argument('--exact', action='store_true', help='Use the exactly solved Q-table')
+    evaluate_parser.add_argument('--seeds', nargs='+', type=int,
+                                 help='Rollout seeds, by default one derived from --seed')
+    evaluate_parser.set_defaults(function=evaluate)
+
+    # Listed for --help only, main() hands the sweep arguments straight to sweep.main
+    commands.add_parser('sweep', help='Run a scenario sweep, see sweep.py --help')
+
+    plot_parser = commands.add_parser('plot', help='Render the results CSV of a sweep')
+    plot_parser.add_argument('results', help='CSV written by the sweep command')
+    plot_parser.add_argument('--output', default='sweep_results.pdf', help='PDF file, or a directory for PNGs')
+    plot_parser.add_argument('--grid', action='store_true', help='Render pages of small-multiple panels')
+    plot_parser.add_argument('--rows', type=int, default=4)
+    plot_parser.add_argument('--columns', type=int, default=4)
+    plot_parser.set_defaults(function=plot)
+
+    population_parser = commands.add_parser('simulate-population',
+                                            help='Control every household of a population and report grid load')
+    population_parser.add_argument('--num-households', type=int, default=100)
+    population_parser.add_argument('--season', choices=SEASONS, default='winter')
+    population_parser.add_argument('--seed', type=int, default=0)
+    population_parser.add_argument('--vectorized', action='store_true',
+                                   help='Use HouseholdPopulation instead of the mesa model')
+    population_parser.add_argument('--episodes', type=int, default=10)
+    population_parser.add_argument('--per-house-type', action='store_true')
+    population_parser.add_argument('--agent-type', choices=['tabular', 'linear'], default='linear')
+    population_parser.add_argument('--hours', type=int, default=NUM_HOURS)
+    population_parser.add_argument('--plot', help='PDF file or directory for the load curve')
+    population_parser.set_defaults(function=simulate_population)
+
+    serve_parser = commands.add_parser('serve', help='Answer scenario requests sent as JSON lines over TCP')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--workers', type=int, default=2)
+    serve_parser.add_argument('--max-pending', type=int, default=64)
+    serve_parser.add_argument('--cache-dir', default='scenario_cache')
+    serve_parser.add_argument('--checkpoints', default='checkpoints')
+    serve_parser.set_defaults(function=serve)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'sweep':
+        return sweep(argv[1:])
+    args = parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import numpy as np
+
+
+class DecaySchedule:
+    def __init__(self, rate, minimum=0.0):
+        """
+        Multiplicative per-episode decay of an agent parameter such as epsilon or alpha.
+
+        Parameters:
+        - rate: Factor applied once per training episode.
+        - minimum: The parameter never decays below this value.
+        """
+        self.rate = rate
+        self.minimum = minimum
+
+    def apply(self, value, episodes=1):
+        """
+        Return `value` after `episodes` episodes of decay.
+        """
+        return max(value * self.rate ** episodes, self.minimum)
+
+
+class ConvergenceCriterion:
+    def __init__(self, check_every=20, tolerance=1e-3, patience=3):
+        """
+        Decide when Q-learning has converged.
+
+        Every `check_every` episodes the Q-table is compared with the one from the previous check.
+        Training has converged once, for `patience` checks in a row, the largest change of a
+        Q-value relative to the largest Q-value is below `tolerance` and no state's greedy action
+        was replaced by a clearly better one.
+
+        Parameters:
+        - check_every: Number of episodes between two checks.
+        - tolerance: Largest relative Q-value change still considered converged.
+        - patience: Number of consecutive converged checks required.
+        """
+        self.check_every = check_every
+        self.tolerance = tolerance
+        self.patience = patience
+        self.reset()
+
+    def reset(self):
+        self.previous_q_table = None
+        self.previous_policy = None
+        self.last_check = 0
+        self.stable_checks = 0
+        self.converged_episode = None
+        self.history = []
+
+    def due(self, episodes_completed):
+        return episodes_completed - self.last_check >= self.check_every
+
+    def check(self, agent, episodes_completed):
+        """
+        Compare the agent's Q-values with the previous check. Works on any agent with a
+        `_flat_q_table` method, such as QLearningAgent with dense storage and LinearQAgent.
+
+        Returns:
+        - True once training has converged.
+        """
+        self.last_check = episodes_completed
+        flat_q_table = q_table = agent._flat_q_table()
+        policy = flat_q_table.argmax(axis=1)
+
+        if self.previous_q_table is not None:
+            scale = max(float(np.max(np.abs(q_table))), 1e-12)
+            max_delta = float(np.max(np.abs(q_table - self.previous_q_table))) / scale
+
+            # A new greedy action only counts as a change when it is better than the old one by more
+            # than the tolerance, so near-ties between equally good actions do not block convergence
+            states = np.arange(len(policy))
+            gain = flat_q_table[states, policy] - flat_q_table[states, self.previous_policy]
+            policy_changes = int(np.count_nonzero(gain > self.tolerance * scale))
+            self.history.append((episodes_completed, max_delta, policy_changes))
+
+            if max_delta < self.tolerance and policy_changes == 0:
+                self.stable_checks += 1
+            else:
+                self.stable_checks = 0
+            if self.stable_checks >= self.patience and self.converged_episode is None:
+                self.converged_episode = episodes_completed
+
+        self.previous_q_table = np.array(q_table)
+        self.previous_policy = policy
+        return self.converged_episode is not None
+
+
+class TrainingReport:
+    def __init__(self, episodes_requested, episodes_run, converged_episode=None, history=None,
+                 epsilon=None, alpha=None):
+        """
+        Outcome of EnergyModel.train_agent.
+
+        - episodes_requested: The episode budget that was passed to train_agent.
+        - episodes_run: Number of episodes actually trained, including resumed ones.
+        - converged_episode: Episode at which the convergence criterion was met, or None.
+        - history: List of (episode, relative max Q-change, number of greedy actions changed).
+        - epsilon, alpha: Agent parameters at the end of training.
+        """
+        self.episodes_requested = episodes_requested
+        self.episodes_run = episodes_run
+        self.converged_episode = converged_episode
+        self.history = history or []
+        self.epsilon = epsilon
+        self.alpha = alpha
+
+    @property
+    def converged(self):
+        return self.converged_episode is not None
+
+    def __repr__(self):
+        status = f"converged at episode {self.converged_episode}" if self.converged else "did not converge"
+        return f"TrainingReport({self.episodes_run}/{self.episodes_requested} episodes, {status})"
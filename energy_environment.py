@@ -1,16 +1,24 @@
 import gym
 from gym import spaces
 import numpy as np
+from observations import ACTION_STATE_SIZE, encode, state_size
+from appliances import GAS_PRICE, SEASON_DAYS, appliance_usage
+from tariff import OFF_PEAK_PRICE, PEAK_PRICE, two_rate_tariff
 
 class EnergyEnvironment(gym.Env):
-    def __init__(self, num_rooms=1, season='winter'):
+    def __init__(self, num_rooms=1, season='winter', tariff=None, features=(), num_people=2, usage_scale=1.0):
         super(EnergyEnvironment, self).__init__()
         
         # Define action and observation space
-        self.action_space = spaces.MultiDiscrete([2, 2, 2, 2, 2])  # Each can be 0 or 1
-        self.observation_space = spaces.MultiDiscrete([2, 2, 2, 2, 2])
+        self.action_space = spaces.MultiDiscrete(ACTION_STATE_SIZE)  # Each can be 0 or 1
+        # Optional discretized features (hour, day of week, temperature, occupancy, rooms, season) follow the state
+        self.features = tuple(features)
+        self.state_size = state_size(self.features)
+        self.observation_space = spaces.MultiDiscrete(self.state_size)
         
         self.num_rooms = num_rooms
+        self.num_people = num_people
+        self.usage_scale = usage_scale  # Scales all usage, e.g. ENERGY_SAVING_FACTOR for energy saving households
         self.season = season
         self.current_hour = 0
         self.current_day = 0
@@ -18,37 +26,23 @@ class EnergyEnvironment(gym.Env):
         
         self.set_seasonal_parameters()
 
+        # Precomputed hourly electricity prices (£ per kWh)
+        self.tariff = tariff or two_rate_tariff(self.peak_price, self.off_peak_price)
+
     def set_seasonal_parameters(self):
         # Electricity prices (pence per kWh)
-        self.peak_price = 24.50  # pence per kWh
-        self.off_peak_price = 22.36  # pence per kWh
-        self.gas_price = 10.00  # pence per kWh
-        
-        if self.season == 'winter':
-            self.appliance_usage = {
-                'washing_machine': 0.12,
-                'fridge': 0.10,
-                'lighting': 0.08,
-                'heating': 0.30,  
-                'gas_heating': 0.5,
-                'gas_cooking': 0.5,
-            }
-        elif self.season == 'summer':
-            self.appliance_usage = {
-                'washing_machine': 0.10,
-                'fridge': 0.12,
-                'lighting': 0.05,
-                'cooling': 0.10,
-                'gas_cooking': 0.8,
-            }
-        else:
-            raise ValueError("Season must be 'winter' or 'summer'")
+        self.peak_price = PEAK_PRICE  # pence per kWh
+        self.off_peak_price = OFF_PEAK_PRICE  # pence per kWh
+        self.gas_price = GAS_PRICE  # pence per kWh
+
+        # Appliance usage (kWh per hour), raises ValueError for an unknown season
+        self.appliance_usage = appliance_usage(self.season)
 
     def reset(self):
         self.state = [0, 0, 1, 0, 0]
         self.current_hour = 0
         self.current_day = 0
-        return np.array(self.state)
+        return self._observation()
 
     def step(self, action):
         light, washing_machine, fridge, gas_heating, gas_cooking = action
@@ -69,23 +63,38 @@ class EnergyEnvironment(gym.Env):
             electricity_used += 2 * self.appliance_usage['heating']
         if 'cooling' in self.appliance_usage:
             electricity_used += 1 * self.appliance_usage['cooling']
+        electricity_used *= self.usage_scale
+        gas_used *= self.usage_scale
 
-        if 7 <= self.current_hour < 17 or 19 <= self.current_hour < 23:
-            electricity_price = self.peak_price / 100
-        else:
-            electricity_price = self.off_peak_price / 100
+        electricity_price = self.current_electricity_price()
 
         gas_price = self.gas_price / 100
-        reward = -(electricity_used * electricity_price + gas_used * gas_price)
+        electricity_cost = electricity_used * electricity_price
+        gas_cost = gas_used * gas_price
+        reward = -(electricity_cost + gas_cost)
 
         self.state = [light, washing_machine, fridge, gas_heating, gas_cooking]
         self.current_hour += 1
         if self.current_hour >= 24:
             self.current_hour = 0
             self.current_day += 1
-        done = self.current_day >= 90
+        done = self.current_day >= SEASON_DAYS
+
+        info = {
+            'electricity_used': electricity_used,
+            'gas_used': gas_used,
+            'electricity_cost': electricity_cost,
+            'gas_cost': gas_cost,
+        }
+        return self._observation(), reward, done, info
+
+    def _observation(self):
+        return encode(np.array(self.state), self.features, self.season, self.current_hour, self.current_day,
+                      self.num_people, self.num_rooms)
 
-        return np.array(self.state), reward, done, {}
+    def current_electricity_price(self):
+        # Electricity price (£ per kWh) for the current hour
+        return self.tariff.price_at(self.current_day, self.current_hour)
 
     def render(self, mode='human'):
         print(f"Day: {self.current_day}, Hour: {self.current_hour}, State: {self.state}")
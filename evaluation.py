@@ -0,0 +1,160 @@
+import numpy as np
+
+from appliances import NUM_HOURS
+from batch_energy_environment import BatchEnergyEnvironment
+from observations import ACTION_STATE_SIZE
+from seeding import make_rng
+
+# Two-sided normal quantiles for the supported confidence levels
+Z_VALUES = {0.90: 1.645, 0.95: 1.960, 0.99: 2.576}
+
+ACTION_DIMS = len(ACTION_STATE_SIZE)
+
+
+class GreedyPolicy:
+    def __init__(self, agent):
+        """
+        Always take the best known action of a trained QLearningAgent.
+        """
+        self.agent = agent
+
+    def reset(self, seeds):
+        pass
+
+    def __call__(self, states, env, step):
+        return self.agent.greedy_actions(states)
+
+
+class RandomPolicy:
+    def __init__(self, probability=0.5):
+        """
+        Switch every appliance on with the given probability, independently on every hour.
+        """
+        self.probability = probability
+        self.rng = None
+
+    def reset(self, seeds):
+        # One stream for the whole batch, seeded by all its seeds, drawn one hour at a time so
+        # memory does not grow with the length of the rollout
+        self.rng = make_rng(np.random.SeedSequence([int(seed) for seed in seeds]))
+
+    def __call__(self, states, env, step):
+        return (self.rng.random((len(states), ACTION_DIMS)) < self.probability).astype(np.int64)
+
+
+class FixedSchedulePolicy:
+    def __init__(self, schedule):
+        """
+        Take the same action at the same hour of every day.
+
+        Parameters:
+        - schedule: Integer array of shape (24, 5) with the action for every hour of the day.
+        """
+        self.schedule = np.asarray(schedule, dtype=np.int64)
+
+    def reset(self, seeds):
+        pass
+
+    def __call__(self, states, env, step):
+        return self.schedule[env.current_hour]
+
+
+class EvaluationResult:
+    def __init__(self, name, seeds, electricity, gas, electricity_cost, gas_cost):
+        """
+        Per-hour results of one policy, every array has shape (num_seeds, num_hours).
+        """
+        self.name = name
+        self.seeds = list(seeds)
+        self.electricity = electricity
+        self.gas = gas
+        self.electricity_cost = electricity_cost
+        self.gas_cost = gas_cost
+        self.cost = electricity_cost + gas_cost
+
+    def totals(self, field):
+        """
+        Return the total of `field` ('electricity', 'gas' or 'cost') over the rollout for every seed.
+        """
+        return getattr(self, field).sum(axis=1)
+
+    def mean(self, field):
+        return float(self.totals(field).mean())
+
+    def confidence_interval(self, field, level=0.95):
+        """
+        Return the (low, high) normal-approximation confidence interval of the mean total across seeds.
+        """
+        totals = self.totals(field)
+        mean = totals.mean()
+        if len(totals) < 2:
+            return float(mean), float(mean)
+        half_width = Z_VALUES[level] * totals.std(ddof=1) / np.sqrt(len(totals))
+        return float(mean - half_width), float(mean + half_width)
+
+
+class _EnvView:
+    # Slice of the batch environment's clock handed to the policy that owns those rows
+    def __init__(self, env, rows):
+        self.current_hour = env.current_hour[rows]
+        self.current_day = env.current_day[rows]
+        self.tariff = env.tariff
+
+
+def evaluate_policies(policies, season, num_rooms, seeds=(0,), tariff=None, features=(), num_people=2,
+                      usage_scale=1.0):
+    """
+    Evaluate several policies over several seeds in a single batched rollout.
+
+    Every (policy, seed) pair gets its own household in one BatchEnergyEnvironment, and usage and
+    cost are read from the environment's own accounting on every hour.
+
+    Parameters:
+    - policies: Dict mapping a name to a policy, see GreedyPolicy, RandomPolicy and FixedSchedulePolicy.
+    - season: 'winter' or 'summer'.
+    - num_rooms: Number of rooms in the household.
+    - seeds: Seeds of the independent rollouts of every policy.
+    - tariff: Electricity Tariff, the two-rate tariff by default.
+    - features, num_people: Observation features handed to the policies, see observations.encode.
+    - usage_scale: Factor applied to the household's usage, see BatchEnergyEnvironment.
+
+    Returns:
+    - Dict mapping every policy name to its EvaluationResult.
+    """
+    names = list(policies)
+    num_seeds = len(seeds)
+    env = BatchEnergyEnvironment(len(names) * num_seeds, num_rooms=num_rooms, season=season, tariff=tariff,
+                                 features=features, num_people=num_people, usage_scale=usage_scale)
+    states = env.reset()
+
+    for policy in policies.values():
+        policy.reset(seeds)
+
+    fields = ['electricity_used', 'gas_used', 'electricity_cost', 'gas_cost']
+    history = {field: np.zeros((NUM_HOURS, env.num_envs)) for field in fields}
+    actions = np.zeros((env.num_envs, ACTION_DIMS), dtype=np.int64)
+
+    for step in range(NUM_HOURS):
+        for i, policy in enumerate(policies.values()):
+            rows = slice(i * num_seeds, (i + 1) * num_seeds)
+            actions[rows] = policy(states[rows], _EnvView(env, rows), step)
+        states, _, _, info = env.step(actions)
+        for field in fields:
+            history[field][step] = info[field]
+
+    results = {}
+    for i, name in enumerate(names):
+        rows = slice(i * num_seeds, (i + 1) * num_seeds)
+        per_seed = {field: history[field][:, rows].T.copy() for field in fields}
+        results[name] = EvaluationResult(name, seeds, per_seed['electricity_used'], per_seed['gas_used'],
+                                         per_seed['electricity_cost'], per_seed['gas_cost'])
+    return results
+
+
+def evaluate_policy(policy, season, num_rooms, seeds=(0,), tariff=None, features=(), num_people=2, usage_scale=1.0):
+    """
+    Evaluate a single policy, see `evaluate_policies`.
+    """
+    return evaluate_policies({'policy': policy}, season, num_rooms, seeds=seeds, tariff=tariff, features=features,
+                             num_people=num_people, usage_scale=usage_scale)['policy']
+
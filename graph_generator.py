@@ -1,56 +1,339 @@
-import matplotlib.pyplot as plt
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+COMPARISON_FIGSIZE = (10, 6)
+CURVE_FIGSIZE = (10, 4)
+
+
+class ComparisonTemplate:
+    '''
+        Electricity, gas and cost of the trained agent against the random policy, on three y-axes.
+
+        The axes, lines and legends are created once, `draw` only replaces the data, so the same
+        figure can be rendered for many scenarios.
+    '''
+    def __init__(self, figure=None):
+        if figure is None:
+            figure = Figure(figsize=COMPARISON_FIGSIZE)
+            FigureCanvasAgg(figure)
+        self.figure = figure
+
+        # Create labels for the x-axis
+        labels = ['Trained Agent', 'Random Policy']
+        x = range(2)
+
+        # Plot electricity usage on the primary y-axis (left side)
+        ax1 = self.figure.add_subplot()
+        self.electricity_line, = ax1.plot(x, [0, 0], marker='o', color='blue', label='Electricity Usage (kWh)',
+                                          linewidth=2)
+        ax1.set_xlabel('Policy')
+        ax1.set_ylabel('Electricity Usage (kWh)', color='blue')
+        ax1.set_xticks(x)
+        ax1.set_xticklabels(labels)
+        ax1.tick_params(axis='y', labelcolor='blue')
+
+        # Create a secondary y-axis for gas usage (right side)
+        ax2 = ax1.twinx()
+        self.gas_line, = ax2.plot(x, [0, 0], marker='s', color='red', label='Gas Usage (kWh)', linewidth=2)
+        ax2.set_ylabel('Gas Usage (kWh)', color='red')
+        ax2.tick_params(axis='y', labelcolor='red')
+
+        # Create a third axis for cost
+        ax3 = ax1.twinx()
+        ax3.spines['right'].set_position(('outward', 60))  # Offset the third axis to avoid overlap
+        self.cost_line, = ax3.plot(x, [0, 0], marker='^', color='green', label='Total Cost (£)', linewidth=2)
+        ax3.set_ylabel('Total Cost (£)', color='green')
+        ax3.tick_params(axis='y', labelcolor='green')
+
+        # Add legends for all y-axes
+        ax1.legend(loc='upper left')
+        ax2.legend(loc='upper right')
+        ax3.legend(loc='center right')
+        ax3.set_title(' ')  # Leave room for the title in the layout
+        self.axes = (ax1, ax2, ax3)
+        self.figure.tight_layout()
+
+    def draw(self, title, trained, random):
+        '''
+            Show the (electricity, gas, cost) totals of the trained agent and the random policy
+        '''
+        lines = (self.electricity_line, self.gas_line, self.cost_line)
+        for axis, line, trained_value, random_value in zip(self.axes, lines, trained, random):
+            line.set_ydata([trained_value, random_value])
+            axis.set_ylim(min(trained_value, random_value) * 0.9, max(trained_value, random_value) * 1.1)
+        self.axes[2].set_title(title)
+        return self.figure
+
+
+class CurveTemplate:
+    '''
+        Line plot of one or more curves, such as hourly load curves or training curves.
+
+        Lines are reused between calls with the same number of curves.
+    '''
+    def __init__(self, figure=None):
+        if figure is None:
+            figure = Figure(figsize=CURVE_FIGSIZE)
+            FigureCanvasAgg(figure)
+        self.figure = figure
+        self.axis = self.figure.add_subplot()
+        self.lines = []
+
+    def draw(self, title, x, curves, xlabel, ylabel):
+        '''
+            Plot every curve of the `curves` dict (label -> array of the same length as x)
+        '''
+        axis = self.axis
+        if len(self.lines) != len(curves):
+            for line in self.lines:
+                line.remove()
+            self.lines = [axis.plot([], [], linewidth=1)[0] for _ in curves]
+        for line, (label, values) in zip(self.lines, curves.items()):
+            line.set_data(x, values)
+            line.set_label(label)
+        axis.relim()
+        axis.autoscale_view()
+        axis.set_title(title)
+        axis.set_xlabel(xlabel)
+        axis.set_ylabel(ylabel)
+        axis.legend(loc='upper right')
+        self.figure.tight_layout()
+        return self.figure
+
+
+class GridTemplate:
+    '''
+        Small multiples of the trained against random cost, one panel per scenario.
+    '''
+    def __init__(self, rows=4, columns=4):
+        self.figure = Figure(figsize=(3 * columns, 2.5 * rows))
+        FigureCanvasAgg(self.figure)
+        axes = self.figure.subplots(rows, columns, squeeze=False).reshape(-1)
+        self.panels = []
+        for axis in axes:
+            bars = axis.bar(['Trained', 'Random'], [0, 0], color=['green', 'grey'])
+            axis.set_title(' ', fontsize=8)  # Leave room for the title in the layout
+            self.panels.append((axis, bars))
+        self.figure.tight_layout()
+
+    @property
+    def size(self):
+        return len(self.panels)
+
+    def draw(self, results):
+        '''
+            Fill one panel per sweep result dict, unused panels are hidden
+        '''
+        for i, (axis, bars) in enumerate(self.panels):
+            axis.set_visible(i < len(results))
+            if i >= len(results):
+                continue
+            result = results[i]
+            costs = (result['cost_trained'], result['cost_random'])
+            for bar, cost in zip(bars, costs):
+                bar.set_height(cost)
+            axis.set_ylim(0, max(costs) * 1.1)
+            axis.set_title(scenario_title(result), fontsize=8)
+        return self.figure
+
+
+def _load_curve(demand):
+    if hasattr(demand, 'load_curve'):
+        return demand.load_curve()
+    if hasattr(demand, 'electricity'):
+        return demand.electricity
+    return np.asarray(demand)
+
+
+def scenario_title(result):
+    '''
+        Short title of a sweep result or scenario dict
+    '''
+    parts = [result['season'].capitalize(), f"rooms={result['num_rooms']}"]
+    for key in ('alpha', 'gamma', 'epsilon', 'seed'):
+        if key in result:
+            parts.append(f"{key}={result[key]}")
+    return ' '.join(parts)
+
+
+class GraphRenderer:
+    '''
+        Renders many results in one pass on the non-interactive Agg backend, reusing one
+        figure per template instead of building a figure per graph.
+    '''
+    def __init__(self, dpi=100):
+        self.dpi = dpi
+        self._comparison = None
+        self._curves = None
+        self._grids = {}
+
+    def comparison(self, title, trained, random):
+        if self._comparison is None:
+            self._comparison = ComparisonTemplate()
+        return self._comparison.draw(title, trained, random)
+
+    def curves(self, title, x, curves, xlabel, ylabel):
+        if self._curves is None:
+            self._curves = CurveTemplate()
+        return self._curves.draw(title, x, curves, xlabel, ylabel)
+
+    def _pages(self, figures, output):
+        '''
+            Save every figure produced by the `figures` iterator to a multi-page PDF, or to
+            numbered PNGs when `output` is a directory. Returns the written file names.
+        '''
+        if output.endswith('.pdf'):
+            with PdfPages(output) as pdf:
+                for figure in figures:
+                    pdf.savefig(figure)
+            return [output]
+
+        os.makedirs(output, exist_ok=True)
+        filenames = []
+        for i, figure in enumerate(figures):
+            filename = os.path.join(output, f'{i:04d}.png')
+            figure.savefig(filename, dpi=self.dpi)
+            filenames.append(filename)
+        return filenames
+
+    def render_comparisons(self, results, output):
+        '''
+            Render one comparison graph per sweep result dict, see sweep.RESULT_FIELDS
+        '''
+        figures = (
+            self.comparison(f"{scenario_title(result)} - Electricity, Gas, and Cost Comparison",
+                            (result['electricity_trained'], result['gas_trained'], result['cost_trained']),
+                            (result['electricity_random'], result['gas_random'], result['cost_random']))
+            for result in results
+        )
+        return self._pages(figures, output)
+
+    def render_grid(self, results, output, rows=4, columns=4):
+        '''
+            Render the trained against random cost of all sweep results as pages of rows x columns panels
+        '''
+        if (rows, columns) not in self._grids:
+            self._grids[rows, columns] = GridTemplate(rows, columns)
+        template = self._grids[rows, columns]
+        results = list(results)
+        figures = (template.draw(results[start:start + template.size])
+                   for start in range(0, len(results), template.size))
+        return self._pages(figures, output)
+
+    def render_load_curves(self, curves, output):
+        '''
+            Render hourly load curves, `curves` maps a title to a GridLoadAggregator,
+            a NeighbourhoodDemand or an array of hourly loads
+        '''
+        figures = (
+            self.curves(title, np.arange(len(load)), {'Electricity (kWh)': load}, 'Hour', 'Load (kWh)')
+            for title, load in ((title, _load_curve(demand)) for title, demand in curves.items())
+        )
+        return self._pages(figures, output)
+
+    def render_training_curves(self, monitors, output, field='episode_return'):
+        '''
+            Render one training curve per TrainingMonitor, `monitors` maps a title to a monitor
+        '''
+        figures = (
+            self.curves(title, records['episode'], {field: records[field]}, 'Episode', field.replace('_', ' '))
+            for title, records in ((title, monitor.records()) for title, monitor in monitors.items())
+        )
+        return self._pages(figures, output)
+
+
+class BackgroundRenderer:
+    '''
+        Run GraphRenderer jobs in a separate worker process so plotting does not stall training.
+
+        A process, unlike a thread, does not compete with training for the GIL, though it still
+        needs a free CPU core to stay out of training's way. Jobs are queued
+        with `submit` and run in order; once `max_pending` jobs are waiting, `submit` blocks until
+        the oldest one is done. Arguments are pickled to the worker, so they must be picklable,
+        and arrays that the caller keeps updating should be passed as copies.
+    '''
+    def __init__(self, dpi=100, max_pending=16):
+        self.max_pending = max_pending
+        self.executor = ProcessPoolExecutor(max_workers=1, initializer=_start_worker_renderer, initargs=(dpi,))
+        self.jobs = collections.deque()
+        self.outputs = []
+        self.errors = []
+
+    def _collect(self, job):
+        try:
+            self.outputs.extend(job.result())
+        except Exception as error:
+            self.errors.append(error)
+
+    def submit(self, method, *args, **kwargs):
+        '''
+            Queue a call to a GraphRenderer method such as 'render_comparisons'
+        '''
+        if len(self.jobs) >= self.max_pending:
+            self._collect(self.jobs.popleft())
+        self.jobs.append(self.executor.submit(_render_job, method, args, kwargs))
+
+    def close(self):
+        '''
+            Wait for the queued jobs and return the written file names
+        '''
+        while self.jobs:
+            self._collect(self.jobs.popleft())
+        self.executor.shutdown()
+        if self.errors:
+            raise self.errors[0]
+        return self.outputs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_worker_renderer = None
+
+
+def _start_worker_renderer(dpi):
+    global _worker_renderer
+    _worker_renderer = GraphRenderer(dpi=dpi)
+
+
+def _render_job(method, args, kwargs):
+    return getattr(_worker_renderer, method)(*args, **kwargs)
+
+
+_renderer = None
+
 
 def generate_comparison_graphs(season, total_electricity_usage_trained, total_gas_usage_trained, total_cost_trained,
-                               total_electricity_usage_random, total_gas_usage_random, total_cost_random):
-    # Create labels for the x-axis
-    labels = ['Trained Agent', 'Random Policy']
-    x = range(2)
-
-    # Create a figure and axis objects for plotting
-    fig, ax1 = plt.subplots(figsize=(10, 6))
-
-    # Plot electricity usage on the primary y-axis (left side)
-    ax1.plot(x, [total_electricity_usage_trained, total_electricity_usage_random], marker='o', color='blue', label='Electricity Usage (kWh)', linewidth=2)
-    ax1.set_xlabel('Policy')
-    ax1.set_ylabel('Electricity Usage (kWh)', color='blue')
-    ax1.set_xticks(x)
-    ax1.set_xticklabels(labels)
-    ax1.tick_params(axis='y', labelcolor='blue')
-
-    # Set limits for electricity usage
-    ax1.set_ylim(min(total_electricity_usage_trained, total_electricity_usage_random) * 0.9,
-                 max(total_electricity_usage_trained, total_electricity_usage_random) * 1.1)
-
-    # Create a secondary y-axis for gas usage (right side)
-    ax2 = ax1.twinx()
-    ax2.plot(x, [total_gas_usage_trained, total_gas_usage_random], marker='s', color='red', label='Gas Usage (units)', linewidth=2)
-    ax2.set_ylabel('Gas Usage (units)', color='red')
-    ax2.tick_params(axis='y', labelcolor='red')
-
-    # Set limits for gas usage
-    ax2.set_ylim(min(total_gas_usage_trained, total_gas_usage_random) * 0.9,
-                 max(total_gas_usage_trained, total_gas_usage_random) * 1.1)
-
-    # Create a third axis for cost
-    ax3 = ax1.twinx()
-    ax3.spines['right'].set_position(('outward', 60))  # Offset the third axis to avoid overlap
-    ax3.plot(x, [total_cost_trained, total_cost_random], marker='^', color='green', label='Total Cost (£)', linewidth=2)
-    ax3.set_ylabel('Total Cost (£)', color='green')
-    ax3.tick_params(axis='y', labelcolor='green')
-
-    # Set limits for cost
-    ax3.set_ylim(min(total_cost_trained, total_cost_random) * 0.9,
-                 max(total_cost_trained, total_cost_random) * 1.1)
-
-    # Set title and layout
-    plt.title(f'{season.capitalize()} - Electricity, Gas, and Cost Comparison')
-
-    # Add legends for all y-axes
-    ax1.legend(loc='upper left')
-    ax2.legend(loc='upper right')
-    ax3.legend(loc='center right')
+                               total_electricity_usage_random, total_gas_usage_random, total_cost_random,
+                               show=False):
+    '''
+        Save the comparison graph of one season, drawn on a reused headless figure. With `show`
+        the graph is drawn with pyplot instead and shown in a window.
+    '''
+    global _renderer
+    title = f'{season.capitalize()} - Electricity, Gas, and Cost Comparison'
+    trained = (total_electricity_usage_trained, total_gas_usage_trained, total_cost_trained)
+    random = (total_electricity_usage_random, total_gas_usage_random, total_cost_random)
+
+    if show:
+        import matplotlib.pyplot as plt
+
+        figure = ComparisonTemplate(plt.figure(figsize=COMPARISON_FIGSIZE)).draw(title, trained, random)
+    else:
+        if _renderer is None:
+            _renderer = GraphRenderer()
+        figure = _renderer.comparison(title, trained, random)
 
     # Save the graph
-    plt.tight_layout()
-    plt.savefig(f'{season}_electricity_gas_cost_comparison_graph.png')
-    plt.show()
+    figure.savefig(f'{season}_electricity_gas_cost_comparison_graph.png')
+    if show:
+        plt.show()
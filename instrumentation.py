@@ -0,0 +1,150 @@
+import csv
+import json
+import time
+
+import numpy as np
+
+# Fields of one per-episode record in the ring buffer
+RECORD_DTYPE = np.dtype([
+    ('episode', np.int64),
+    ('steps', np.int64),
+    ('episode_return', np.float64),
+    ('epsilon', np.float64),
+    ('alpha', np.float64),
+    ('mean_td_error', np.float64),
+    ('q_delta_norm', np.float64),
+    ('choose_action_seconds', np.float64),
+    ('env_step_seconds', np.float64),
+    ('learn_seconds', np.float64),
+    ('episode_seconds', np.float64),
+])
+
+
+class TrainingMonitor:
+    def __init__(self, capacity=10000, callback=None):
+        """
+        Opt-in counters and timers for EnergyModel.train_agent.
+
+        The training loop only calls into the monitor when one is passed, so training without a
+        monitor runs the uninstrumented loop. Per-episode records are kept in a preallocated ring
+        buffer of the last `capacity` episodes.
+
+        Parameters:
+        - capacity: Number of episode records kept in memory.
+        - callback: Optional function called with every finished episode record as a dict.
+        """
+        self.capacity = capacity
+        self.callback = callback
+        self.buffer = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self.num_episodes = 0
+
+        # Totals over the whole run
+        self.totals = {'steps': 0, 'choose_action_seconds': 0.0, 'env_step_seconds': 0.0, 'learn_seconds': 0.0,
+                       'episode_seconds': 0.0}
+
+        self._reset_episode()
+
+    def _reset_episode(self):
+        self.steps = 0
+        self.episode_return = 0.0
+        self.td_error_sum = 0.0
+        self.td_error_count = 0
+        self.choose_action_seconds = 0.0
+        self.env_step_seconds = 0.0
+        self.learn_seconds = 0.0
+        self.q_table_before = None
+        self.episode_start = 0.0
+
+    def begin_episode(self, agent):
+        self._reset_episode()
+        self.q_table_before = agent.q_table.copy() if agent.q_table is not None else None
+        self.episode_start = time.perf_counter()
+
+    def record_step(self, reward, td_error, choose_action_seconds, env_step_seconds, learn_seconds):
+        """
+        Add one training step, or a batch of parallel steps when reward and td_error are arrays.
+        """
+        td_error = np.abs(td_error)
+        self.steps += np.size(reward)
+        self.episode_return += np.sum(reward)
+        self.td_error_sum += np.sum(td_error)
+        self.td_error_count += np.size(td_error)
+        self.choose_action_seconds += choose_action_seconds
+        self.env_step_seconds += env_step_seconds
+        self.learn_seconds += learn_seconds
+
+    def end_episode(self, agent, num_envs=1):
+        """
+        Close the current episode and store its record.
+
+        Parameters:
+        - agent: The agent being trained, to read epsilon, alpha and the Q-table change.
+        - num_envs: Number of parallel environments in the episode, the return is averaged over them.
+        """
+        episode_seconds = time.perf_counter() - self.episode_start
+        record = (
+            self.num_episodes,
+            self.steps,
+            self.episode_return / num_envs,
+            agent.epsilon,
+            agent.alpha,
+            self.td_error_sum / max(self.td_error_count, 1),
+            # Not tracked for sparse Q-tables, whose rows can be evicted during the episode
+            float(np.linalg.norm(agent.q_table - self.q_table_before)) if self.q_table_before is not None else np.nan,
+            self.choose_action_seconds,
+            self.env_step_seconds,
+            self.learn_seconds,
+            episode_seconds,
+        )
+        self.buffer[self.num_episodes % self.capacity] = record
+        self.num_episodes += 1
+
+        self.totals['steps'] += self.steps
+        self.totals['choose_action_seconds'] += self.choose_action_seconds
+        self.totals['env_step_seconds'] += self.env_step_seconds
+        self.totals['learn_seconds'] += self.learn_seconds
+        self.totals['episode_seconds'] += episode_seconds
+
+        if self.callback is not None:
+            self.callback(dict(zip(RECORD_DTYPE.names, record)))
+
+    def records(self):
+        """
+        Return the buffered episode records, oldest first, as a NumPy structured array.
+        """
+        if self.num_episodes <= self.capacity:
+            return self.buffer[:self.num_episodes].copy()
+        start = self.num_episodes % self.capacity
+        return np.concatenate([self.buffer[start:], self.buffer[:start]])
+
+    def summary(self):
+        """
+        Return the run totals with the share of time spent in each part of the loop and the
+        overhead outside of it, which is mostly Python interpreter time.
+        """
+        summary = dict(self.totals)
+        summary['episodes'] = self.num_episodes
+        total = self.totals['episode_seconds']
+        if total > 0:
+            timed = 0.0
+            for part in ('choose_action', 'env_step', 'learn'):
+                summary[f'{part}_share'] = self.totals[f'{part}_seconds'] / total
+                timed += self.totals[f'{part}_seconds']
+            summary['loop_overhead_share'] = 1 - timed / total
+            summary['steps_per_sec'] = self.totals['steps'] / total
+        return summary
+
+    def dump_csv(self, filename):
+        records = self.records()
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(RECORD_DTYPE.names)
+            writer.writerows(records.tolist())
+
+    def dump_json(self, filename):
+        records = self.records()
+        with open(filename, 'w') as f:
+            json.dump({
+                'summary': self.summary(),
+                'episodes': [dict(zip(RECORD_DTYPE.names, record)) for record in records.tolist()],
+            }, f, indent=2)
@@ -0,0 +1,207 @@
+import numpy as np
+from seeding import make_rng
+
+
+class ReplayBuffer:
+    def __init__(self, capacity, state_dims):
+        """
+        Preallocated ring buffer of transitions for minibatch training.
+
+        Parameters:
+        - capacity: Number of transitions kept, the oldest ones are overwritten first.
+        - state_dims: Length of a state vector.
+        """
+        self.capacity = capacity
+        self.states = np.zeros((capacity, state_dims), dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity)
+        self.next_states = np.zeros((capacity, state_dims), dtype=np.int64)
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, states, actions, rewards, next_states):
+        """
+        Store a batch of transitions, `actions` being flat action indices.
+        """
+        num_new = len(actions)
+        if num_new > self.capacity:
+            # Only the most recent transitions fit
+            states, actions, rewards, next_states = (states[-self.capacity:], actions[-self.capacity:],
+                                                     rewards[-self.capacity:], next_states[-self.capacity:])
+            num_new = self.capacity
+        slots = (self.position + np.arange(num_new)) % self.capacity
+        self.states[slots] = states
+        self.actions[slots] = actions
+        self.rewards[slots] = rewards
+        self.next_states[slots] = next_states
+        self.position = (self.position + num_new) % self.capacity
+        self.size = min(self.size + num_new, self.capacity)
+
+    def sample(self, rng, batch_size):
+        slots = rng.integers(self.size, size=batch_size)
+        return self.states[slots], self.actions[slots], self.rewards[slots], self.next_states[slots]
+
+
+class LinearQAgent:
+    def __init__(self, state_size, action_size, alpha=0.1, gamma=0.95, epsilon=0.05, rng=None, batch_size=64,
+                 buffer_size=100000):
+        """
+        Q-learning agent with a linear Q-function, a drop-in alternative to QLearningAgent.
+
+        Every state dimension is one-hot encoded and Q(s, a) is the sum of one weight per active
+        feature plus a bias, with a separate weight column for every flat action. The weight
+        matrix grows with the sum of state_size instead of its product, so observation features
+        such as hour, occupancy, room count and season can be added without the memory of a
+        Q-table, and one agent can be trained on households of every configuration.
+
+        Transitions go into a ring replay buffer and every call to `learn` or `learn_batch`
+        performs one vectorized update on a uniformly sampled minibatch. As in
+        QLearningAgent.learn_batch, a weight hit by several transitions of the minibatch moves by
+        the mean of their TD errors, scaled so that Q(s, a) moves by alpha times the TD error.
+
+        Parameters:
+        - state_size: List with the number of values of every state dimension.
+        - action_size: List with the number of values of every action dimension.
+        - alpha: Learning rate.
+        - gamma: Discount factor.
+        - epsilon: Exploration rate.
+        - rng: Seed or numpy.random.Generator used for exploration and replay sampling.
+        - batch_size: Number of replayed transitions per update.
+        - buffer_size: Capacity of the replay buffer.
+        """
+        self.state_size = list(state_size)
+        self.action_size = list(action_size)
+        self.alpha = alpha  # Learning rate
+        self.gamma = gamma  # Discount factor
+        self.epsilon = epsilon  # Exploration rate
+        self.rng = make_rng(rng)
+        self.batch_size = batch_size
+
+        # Feature index of value 0 of every state dimension, the bias is the last feature
+        self.feature_offsets = np.concatenate([[0], np.cumsum(self.state_size)[:-1]]).astype(np.int64)
+        self.num_features = int(np.sum(self.state_size)) + 1
+        self.num_actions = int(np.prod(self.action_size))
+        self.weights = np.zeros((self.num_features, self.num_actions))
+        self.replay = ReplayBuffer(buffer_size, len(self.state_size))
+
+        # There is no Q-table, EnergyModel uses this to skip table-only features
+        self.q_table = None
+
+    def _active_features(self, states):
+        """
+        Return the indices of the active features of a batch of states, shape (n, len(state_size) + 1).
+        """
+        states = np.asarray(states, dtype=np.int64).reshape(-1, len(self.state_size))
+        features = np.empty((len(states), len(self.state_size) + 1), dtype=np.int64)
+        features[:, :-1] = states + self.feature_offsets
+        features[:, -1] = self.num_features - 1
+        return features
+
+    def q_values(self, states):
+        """
+        Return the Q-values of every flat action for a batch of states, shape (n, num_actions).
+        """
+        return self.weights[self._active_features(states)].sum(axis=1)
+
+    def _flat_q_table(self):
+        """
+        Return the Q-values of every state and flat action, shape (num_states, num_actions), in the
+        layout of QLearningAgent._flat_q_table, so a ConvergenceCriterion can check this agent too.
+        """
+        states = np.stack(np.unravel_index(np.arange(int(np.prod(self.state_size))), self.state_size), axis=1)
+        return self.q_values(states)
+
+    def choose_actions(self, states):
+        """
+        Choose an epsilon-greedy action for every state in a batch, see QLearningAgent.choose_actions.
+        """
+        action_indices = np.argmax(self.q_values(states), axis=1)
+        explore = self.rng.random(len(action_indices)) < self.epsilon
+        action_indices[explore] = self.rng.integers(self.num_actions, size=int(explore.sum()))
+        return np.stack(np.unravel_index(action_indices, self.action_size), axis=1)
+
+    def greedy_actions(self, states):
+        """
+        Return the best known action for every state in a batch, without exploration.
+        """
+        action_indices = np.argmax(self.q_values(states), axis=1)
+        return np.stack(np.unravel_index(action_indices, self.action_size), axis=1)
+
+    def choose_action(self, state):
+        return self.choose_actions(np.asarray(state)[None])[0].tolist()
+
+    def learn(self, state, action, reward, next_state):
+        """
+        Store one transition and run one minibatch update.
+
+        Returns:
+        - The TD error of the transition before the update.
+        """
+        return self.learn_batch(np.asarray(state)[None], np.asarray(action)[None], np.array([reward]),
+                                np.asarray(next_state)[None])[0]
+
+    def learn_batch(self, states, actions, rewards, next_states):
+        """
+        Store a batch of transitions from parallel environments and run one minibatch update.
+
+        The minibatch is at least as large as the batch of new transitions.
+
+        Returns:
+        - Array of shape (n,) with the TD error of every new transition before the update.
+        """
+        action_indices = np.ravel_multi_index(np.asarray(actions).T, self.action_size)
+        td_errors = self._td_errors(states, action_indices, rewards, next_states)
+        self.replay.push(states, action_indices, rewards, next_states)
+
+        batch = self.replay.sample(self.rng, max(self.batch_size, len(action_indices)))
+        self._update(*batch)
+        return td_errors
+
+    def _td_errors(self, states, action_indices, rewards, next_states):
+        current_q = self.q_values(states)[np.arange(len(action_indices)), action_indices]
+        next_max_q = np.max(self.q_values(next_states), axis=1)
+        return rewards + self.gamma * next_max_q - current_q
+
+    def _update(self, states, action_indices, rewards, next_states):
+        features = self._active_features(states)
+        td_errors = self._td_errors(states, action_indices, rewards, next_states)
+
+        # Mean TD error of every (feature, action) weight hit by the minibatch
+        weight_indices = (features * self.num_actions + action_indices[:, None]).reshape(-1)
+        td_sums = np.bincount(weight_indices, weights=np.repeat(td_errors, features.shape[1]),
+                              minlength=self.weights.size)
+        counts = np.bincount(weight_indices, minlength=self.weights.size)
+        updated = np.nonzero(counts)[0]
+
+        # Every active feature gets an equal share of the step
+        step = self.alpha / features.shape[1]
+        self.weights.reshape(-1)[updated] += step * td_sums[updated] / counts[updated]
+
+    def memory_bytes(self):
+        """
+        Return the memory used by the weights and the replay buffer in bytes.
+        """
+        replay = self.replay
+        return (self.weights.nbytes + replay.states.nbytes + replay.actions.nbytes + replay.rewards.nbytes +
+                replay.next_states.nbytes)
+
+    def update_epsilon(self, decay_rate):
+        self.epsilon *= decay_rate
+
+    def save_q_table(self, filename):
+        """
+        Save the weights to a file, under the same name as QLearningAgent.save_q_table.
+        """
+        np.save(filename, self.weights)
+
+    def load_q_table(self, filename, mmap_mode=None):
+        """
+        Load weights saved with `save_q_table`.
+        """
+        weights = np.load(filename, mmap_mode=mmap_mode)
+        if weights.shape != self.weights.shape:
+            raise ValueError(f"Expected weights of shape {self.weights.shape}, got {weights.shape}")
+        self.weights = weights
@@ -1,22 +1,186 @@
-from models.agent import Household
-from models.model import HouseholdEnergyModel
 from q_learning_agent import QLearningAgent
-from energy_environment import EnergyEnvironment
+from linear_agent import LinearQAgent
+from batch_energy_environment import BatchEnergyEnvironment
+from seeding import component_rngs
+from observations import ACTION_STATE_SIZE, state_size
+from tariff import two_rate_tariff
+from appliances import NUM_HOURS, SEASONS
 import numpy as np
-from graph_generator import generate_comparison_graphs
+import time
+from contextlib import nullcontext
+from mdp_solver import solve_q_table
+from checkpoint import CheckpointStore
+from convergence import ConvergenceCriterion, DecaySchedule, TrainingReport
+from evaluation import GreedyPolicy, RandomPolicy, evaluate_policies, evaluate_policy
+from neighbourhood import NeighbourhoodController
+
+# Environment steps in one training episode, a whole season
+EPISODE_STEPS = NUM_HOURS
+
 
 class EnergyModel:
-    def __init__(self, num_households, num_rooms, season):
+    def __init__(self, num_households, num_rooms, season, alpha=0.1, gamma=0.95, epsilon=0.05,
+                 vectorized_population=False, tariff=None, seed=None, features=(), num_people=2, storage='auto',
+                 max_states=None, agent_type='tabular'):
         self.num_households = num_households
         self.num_rooms = num_rooms
         self.season = season
-        self.household_model = HouseholdEnergyModel(num_households, season)
-        
+        self.tariff = tariff
+        self.seed = seed
+        self.features = tuple(features)
+        self.num_people = num_people
+        self.agent_type = agent_type
+        self.hyperparameters = {'alpha': alpha, 'gamma': gamma, 'epsilon': epsilon}
+
+        # Independent random streams for the household population, the agent's exploration, the
+        # per-household controllers and the evaluation rollouts
+        rngs = component_rngs(seed, ['household_model', 'agent', 'neighbourhood', 'evaluation'])
+        self.neighbourhood_rng = rngs['neighbourhood']
+        self.evaluation_seed = int(rngs['evaluation'].integers(2**31))
+
+        # The household population is only built, and mesa only imported, when it is first used
+        self.vectorized_population = vectorized_population
+        self._household_rng = rngs['household_model']
+        self._household_model = None
+
         # Updated to include 5 actions (light, washing_machine, fridge, gas_heating, gas_cooking)
-        self.q_learning_agent = QLearningAgent(state_size=[2, 2, 2, 2, 2], action_size=[2, 2, 2, 2, 2])
+        # The state is the previous action followed by the optional observation features
+        if agent_type == 'tabular':
+            self.q_learning_agent = QLearningAgent(state_size=state_size(self.features),
+                                                   action_size=list(ACTION_STATE_SIZE), alpha=alpha, gamma=gamma,
+                                                   epsilon=epsilon, rng=rngs['agent'], storage=storage,
+                                                   max_states=max_states)
+        elif agent_type == 'linear':
+            self.q_learning_agent = LinearQAgent(state_size=state_size(self.features),
+                                                 action_size=list(ACTION_STATE_SIZE), alpha=alpha, gamma=gamma,
+                                                 epsilon=epsilon, rng=rngs['agent'])
+        else:
+            raise ValueError("agent_type must be 'tabular' or 'linear'")
+
+    @property
+    def household_model(self):
+        if self._household_model is None:
+            if self.vectorized_population:
+                from models.population import HouseholdPopulation
+
+                self._household_model = HouseholdPopulation(self.num_households, self.season,
+                                                            rng=self._household_rng)
+            else:
+                from models.model import HouseholdEnergyModel
+
+                self._household_model = HouseholdEnergyModel(self.num_households, self.season,
+                                                             rng=self._household_rng)
+        return self._household_model
+
+    def scenario_config(self, episodes=2000, num_envs=1, convergence=None, epsilon_schedule=None,
+                        alpha_schedule=None):
+        # Everything that determines the trained Q-table, used to key checkpoints
+        agent = self.q_learning_agent
+        tariff = self.tariff or two_rate_tariff()
+        config = {
+            'season': self.season,
+            'num_rooms': self.num_rooms,
+            'tariff': tariff.fingerprint(),
+            'alpha': self.hyperparameters['alpha'],
+            'gamma': self.hyperparameters['gamma'],
+            'epsilon': self.hyperparameters['epsilon'],
+            'seed': self.seed,
+            'episodes': episodes,
+            # Batched training averages colliding updates, so it learns a different Q-table
+            'num_envs': num_envs,
+            'state_size': list(agent.state_size),
+            'action_size': list(agent.action_size),
+        }
+        if self.agent_type != 'tabular':
+            config['agent_type'] = self.agent_type
+        if self.features:
+            config['features'] = list(self.features)
+            config['num_people'] = self.num_people
+        if convergence is not None:
+            config['convergence'] = [convergence.check_every, convergence.tolerance, convergence.patience]
+        if epsilon_schedule is not None:
+            config['epsilon_schedule'] = [epsilon_schedule.rate, epsilon_schedule.minimum]
+        if alpha_schedule is not None:
+            config['alpha_schedule'] = [alpha_schedule.rate, alpha_schedule.minimum]
+        return config
 
-    def train_agent(self, episodes=2000):
-        env = EnergyEnvironment(num_rooms=self.num_rooms, season=self.season)
+    def train_agent(self, episodes=2000, num_envs=1, store=None, checkpoint_every=None, monitor=None,
+                    convergence=None, epsilon_schedule=None, alpha_schedule=None):
+        """
+        Train the agent, optionally checkpointing to a CheckpointStore.
+
+        With a store, training resumes from the last checkpoint of the same scenario, and the
+        Q-table is saved every `checkpoint_every` episodes and once training is finished.
+        A TrainingMonitor passed as `monitor` records per-episode timings and learning metrics.
+        A ConvergenceCriterion passed as `convergence` stops training early once the Q-table has
+        settled, and DecaySchedules decay epsilon and alpha after every episode.
+
+        Returns a TrainingReport with the number of episodes run and the convergence episode.
+        """
+        agent = self.q_learning_agent
+        if agent.q_table is None and store is not None:
+            raise ValueError("Checkpoints need a dense Q-table")
+        if convergence is not None and agent.q_table is None and self.agent_type == 'tabular':
+            raise ValueError("Convergence checks need a dense Q-table or a linear agent")
+        config = self.scenario_config(episodes, num_envs, convergence, epsilon_schedule, alpha_schedule)
+        # Only one process at a time trains a scenario of the store, the others then resume from its result
+        with store.lock(config) if store is not None else nullcontext():
+            episodes_completed = 0
+            complete = False
+            if store is not None:
+                checkpoint = store.load(config)
+                if checkpoint is not None:
+                    q_table, metadata = checkpoint
+                    agent.q_table = np.array(q_table)
+                    episodes_completed = metadata['episodes_completed']
+                    complete = metadata['complete']
+                    agent.alpha = metadata.get('alpha', agent.alpha)
+                    agent.epsilon = metadata.get('epsilon', agent.epsilon)
+            if convergence is not None:
+                convergence.reset()
+                convergence.last_check = episodes_completed
+
+            # Sequential training advances one episode at a time, batched training one group of environments
+            episodes_per_step = num_envs if num_envs > 1 else 1
+            while not complete and episodes_completed < episodes:
+                num_episodes = min(episodes_per_step, episodes - episodes_completed)
+                if num_envs > 1:
+                    self.train_agent_batched(num_episodes, num_envs, monitor=monitor)
+                else:
+                    self._train_episodes(num_episodes, monitor=monitor)
+                previous_completed = episodes_completed
+                episodes_completed += num_episodes
+
+                if epsilon_schedule is not None:
+                    agent.epsilon = epsilon_schedule.apply(agent.epsilon, num_episodes)
+                if alpha_schedule is not None:
+                    agent.alpha = alpha_schedule.apply(agent.alpha, num_episodes)
+
+                if convergence is not None and convergence.due(episodes_completed):
+                    complete = convergence.check(agent, episodes_completed)
+                complete = complete or episodes_completed == episodes
+
+                checkpoint_due = (checkpoint_every and
+                                  episodes_completed // checkpoint_every > previous_completed // checkpoint_every)
+                if store is not None and (checkpoint_due or complete):
+                    store.save(config, agent.q_table, episodes_completed, episodes_completed * EPISODE_STEPS,
+                               complete=complete, alpha=agent.alpha, epsilon=agent.epsilon)
+
+        return TrainingReport(
+            episodes, episodes_completed,
+            converged_episode=convergence.converged_episode if convergence is not None else None,
+            history=convergence.history if convergence is not None else None,
+            epsilon=agent.epsilon, alpha=agent.alpha,
+        )
+
+    def _train_episodes(self, episodes, monitor=None):
+        from energy_environment import EnergyEnvironment
+
+        env = EnergyEnvironment(num_rooms=self.num_rooms, season=self.season, tariff=self.tariff,
+                                features=self.features, num_people=self.num_people)
+        if monitor is not None:
+            self._train_episodes_instrumented(env, episodes, monitor)
+            return
 
         for episode in range(episodes):
             state = env.reset()
@@ -27,89 +191,185 @@ class EnergyModel:
                 self.q_learning_agent.learn(state, action, reward, next_state)
                 state = next_state
 
-    def test_agent_exploitation(self):
-        env = EnergyEnvironment(num_rooms=self.num_rooms, season=self.season)
-        state = env.reset()
-        total_energy_used = 0
-        total_gas_used = 0
-        total_cost = 0
-
-        for _ in range(90):  # Simulate for 90 days
-            for hour in range(24):
-                action = self.q_learning_agent.choose_action(state)  # Exploit best known action
-                state, reward, done, _ = env.step(action)
-                energy_used = -reward / (env.peak_price / 100 if 7 <= hour < 17 or 19 <= hour < 23 else env.off_peak_price / 100)
-                cost = energy_used * (env.peak_price / 100 if 7 <= hour < 17 or 19 <= hour < 23 else env.off_peak_price / 100)
-                
-                # Simulate gas usage if heating or cooking is active
-                gas_used = sum(action[-2:]) * env.appliance_usage.get('gas_heating', 0) + sum(action[-1:]) * env.appliance_usage.get('gas_cooking', 0)
-                total_energy_used += energy_used
-                total_gas_used += gas_used
-                total_cost += cost + (gas_used * 0.04)  # Assuming 0.04 £ per unit of gas
-
-        return total_energy_used, total_gas_used, total_cost
-
-    def run(self):
-        print(f"\nTraining agent for {self.season} season...")
-        self.train_agent()
-        print(f"Testing agent for {self.season} season...")
+    def _train_episodes_instrumented(self, env, episodes, monitor):
+        # Same loop as _train_episodes with every part timed, kept separate so the default loop pays nothing
+        agent = self.q_learning_agent
+        clock = time.perf_counter
+        for episode in range(episodes):
+            monitor.begin_episode(agent)
+            state = env.reset()
+            done = False
+            while not done:
+                t0 = clock()
+                action = agent.choose_action(state)
+                t1 = clock()
+                next_state, reward, done, _ = env.step(action)
+                t2 = clock()
+                td_error = agent.learn(state, action, reward, next_state)
+                t3 = clock()
+                monitor.record_step(reward, td_error, t1 - t0, t2 - t1, t3 - t2)
+                state = next_state
+            monitor.end_episode(agent)
+
+    def train_agent_batched(self, episodes=2000, num_envs=64, monitor=None):
+        # Run the episodes as groups of parallel environments that share the same Q-table
+        for start in range(0, episodes, num_envs):
+            env = BatchEnergyEnvironment(min(num_envs, episodes - start), num_rooms=self.num_rooms, season=self.season,
+                                         tariff=self.tariff, features=self.features, num_people=self.num_people)
+            if monitor is not None:
+                self._train_batch_instrumented(env, monitor)
+                continue
+
+            states = env.reset()
+            done = False
+            while not done:
+                actions = self.q_learning_agent.choose_actions(states)
+                next_states, rewards, dones, _ = env.step(actions)
+                self.q_learning_agent.learn_batch(states, actions, rewards, next_states)
+                states = next_states
+                done = dones.all()
 
-        # Test agent performance
-        total_electricity_usage_trained, total_gas_usage_trained, total_cost_trained = self.test_agent_exploitation()
+    def _train_batch_instrumented(self, env, monitor):
+        # One group of parallel episodes is recorded as a single monitor episode
+        agent = self.q_learning_agent
+        clock = time.perf_counter
+        monitor.begin_episode(agent)
+        states = env.reset()
+        done = False
+        while not done:
+            t0 = clock()
+            actions = agent.choose_actions(states)
+            t1 = clock()
+            next_states, rewards, dones, _ = env.step(actions)
+            t2 = clock()
+            td_errors = agent.learn_batch(states, actions, rewards, next_states)
+            t3 = clock()
+            monitor.record_step(rewards, td_errors, t1 - t0, t2 - t1, t3 - t2)
+            states = next_states
+            done = dones.all()
+        monitor.end_episode(agent, num_envs=env.num_envs)
 
-        # Test random policy performance
-        total_electricity_usage_random, total_gas_usage_random, total_cost_random = self.test_random_policy()
+    def control_households(self, episodes=10, per_house_type=False, agent_type='linear', hours=EPISODE_STEPS):
+        """
+        Let every household of the population run its own environment under a shared policy, or
+        one policy per house type, and return the controller and the aggregate hourly demand of
+        `hours` simulated hours.
+        """
+        hyperparameters = self.hyperparameters
+        controller = NeighbourhoodController(self.household_model, tariff=self.tariff, per_house_type=per_house_type,
+                                             agent_type=agent_type, alpha=hyperparameters['alpha'],
+                                             gamma=hyperparameters['gamma'], epsilon=hyperparameters['epsilon'],
+                                             rng=self.neighbourhood_rng)
+        controller.train(episodes)
+        return controller, controller.simulate(hours=hours)
+
+    def solve_agent(self):
+        # The environment is deterministic, so the optimal Q-table can be computed directly
+        agent = self.q_learning_agent
+        if self.features not in ((), ('hour',)) or agent.q_table is None:
+            raise ValueError("The exact solver only covers the dense previous-action state, optionally with the hour")
+        agent.q_table = solve_q_table(self.season, self.num_rooms, gamma=agent.gamma,
+                                      hour_conditioned=self.features == ('hour',), tariff=self.tariff)
+
+    def rollout_seeds(self, num_seeds=1):
+        # Seeds of the evaluation rollouts, derived from the model seed so that every model seed
+        # is compared against its own random baseline
+        return tuple(range(self.evaluation_seed, self.evaluation_seed + num_seeds))
+
+    def evaluate(self, seeds=None):
+        # Roll out the trained agent and a random policy side by side on the same seeds
+        seeds = self.rollout_seeds() if seeds is None else seeds
+        policies = {
+            'trained': GreedyPolicy(self.q_learning_agent),
+            'random': RandomPolicy(),
+        }
+        return evaluate_policies(policies, self.season, self.num_rooms, seeds=seeds, tariff=self.tariff,
+                                 features=self.features, num_people=self.num_people)
+
+    def test_agent_exploitation(self, seeds=None):
+        seeds = self.rollout_seeds() if seeds is None else seeds
+        result = evaluate_policy(GreedyPolicy(self.q_learning_agent), self.season, self.num_rooms, seeds=seeds,
+                                 tariff=self.tariff, features=self.features, num_people=self.num_people)
+        return result.mean('electricity'), result.mean('gas'), result.mean('cost')
+
+    def run(self, exact=False, seeds=None, store=None, early_stopping=True, show_graphs=False, num_envs=None):
+        # Stop training once the Q-values settle, decaying alpha so the Q-values can settle
+        training_options = {}
+        if self.q_learning_agent.q_table is None:
+            # Checkpoints work on Q-tables only, and convergence checks on dense Q-tables and linear agents
+            store = None
+            early_stopping = early_stopping and self.agent_type == 'linear'
+        if num_envs is None:
+            # The linear agent replays a minibatch on every step, so it is trained on batches of episodes
+            num_envs = 64 if self.agent_type == 'linear' else 1
+        if early_stopping:
+            training_options = {'convergence': ConvergenceCriterion(tolerance=5e-3),
+                                'alpha_schedule': DecaySchedule(0.995, 0.01)}
+        config = self.scenario_config(num_envs=num_envs, **training_options)
+
+        if exact:
+            print(f"\nSolving agent for {self.season} season...")
+            self.solve_agent()
+        elif store is not None and store.has_complete(config):
+            print(f"\nLoading trained agent for {self.season} season from {store.root}...")
+            q_table, _ = store.load(config, mmap_mode='r')
+            self.q_learning_agent.q_table = q_table
+        else:
+            print(f"\nTraining agent for {self.season} season...")
+            report = self.train_agent(num_envs=num_envs, store=store, **training_options)
+            print(f"Trained for {report.episodes_run} episodes" +
+                  (f", converged at episode {report.converged_episode}" if report.converged else ""))
+        print(f"Testing agent for {self.season} season...")
+
+        # Test agent and random policy performance
+        seeds = self.rollout_seeds(10) if seeds is None else seeds
+        results = self.evaluate(seeds)
+        trained, random = results['trained'], results['random']
+        total_electricity_usage_trained, total_gas_usage_trained, total_cost_trained = (
+            trained.mean('electricity'), trained.mean('gas'), trained.mean('cost'))
+        total_electricity_usage_random, total_gas_usage_random, total_cost_random = (
+            random.mean('electricity'), random.mean('gas'), random.mean('cost'))
 
         # Print results
         print("\nResults with trained agent:")
         print(f"Electricity and Gas Usage and Cost for {self.season.capitalize()}")
         print(f"Total Electricity Usage: {total_electricity_usage_trained} kWh\n"
-              f"Total Gas Usage: {total_gas_usage_trained} units\n"
+              f"Total Gas Usage: {total_gas_usage_trained} kWh\n"
               f"Total Cost: £{total_cost_trained:.2f}\n")
 
         print("\nResults with random policy:")
         print(f"{self.season.capitalize()} - Total Electricity Usage: {total_electricity_usage_random} kWh\n"
-              f"Total Gas Usage: {total_gas_usage_random} units\n"
-              f"Total Cost: £{total_cost_random:.2f}\n")
+              f"Total Gas Usage: {total_gas_usage_random} kWh\n"
+              f"Total Cost: £{total_cost_random:.2f}")
+        if len(seeds) > 1:
+            low, high = random.confidence_interval('cost')
+            print(f"95% confidence interval over {len(seeds)} seeds: £{low:.2f} - £{high:.2f}")
+        print()
 
         print("\nPerformance improvement with trained agent:")
         print(f"{self.season.capitalize()} - Total Electricity Usage Reduction (vs Random): {total_electricity_usage_random - total_electricity_usage_trained} kWh\n"
-              f"Total Gas Usage Reduction (vs Random): {total_gas_usage_random - total_gas_usage_trained} units\n"
+              f"Total Gas Usage Reduction (vs Random): {total_gas_usage_random - total_gas_usage_trained} kWh\n"
               f"Total Cost Reduction (vs Random): £{total_cost_random - total_cost_trained:.2f}\n")
         
         # Generate and save comparison graphs
+        from graph_generator import generate_comparison_graphs
+
         generate_comparison_graphs(self.season, total_electricity_usage_trained, total_gas_usage_trained, total_cost_trained,
-                                    total_electricity_usage_random, total_gas_usage_random, total_cost_random)
-
-    def test_random_policy(self):
-        env = EnergyEnvironment(num_rooms=self.num_rooms, season=self.season)
-        state = env.reset()
-        total_energy_used = 0
-        total_gas_used = 0
-        total_cost = 0
-
-        for _ in range(90):  # Simulate for 90 days
-            for hour in range(24):
-                action = [np.random.choice([0, 1]) for _ in range(len(state))]
-                state, reward, done, _ = env.step(action)
-                energy_used = -reward / (env.peak_price / 100 if 7 <= hour < 17 or 19 <= hour < 23 else env.off_peak_price / 100)
-                cost = energy_used * (env.peak_price / 100 if 7 <= hour < 17 or 19 <= hour < 23 else env.off_peak_price / 100)
-                
-                # Simulate gas usage
-                gas_used = sum(action[-2:]) * env.appliance_usage.get('gas_heating', 0) + sum(action[-1:]) * env.appliance_usage.get('gas_cooking', 0)
-                total_energy_used += energy_used
-                total_gas_used += gas_used
-                total_cost += cost + (gas_used * 0.04)  # Assuming 0.04 £ per unit of gas
-
-        return total_energy_used, total_gas_used, total_cost
+                                    total_electricity_usage_random, total_gas_usage_random, total_cost_random,
+                                    show=show_graphs)
+
+    def test_random_policy(self, seeds=None):
+        seeds = self.rollout_seeds() if seeds is None else seeds
+        result = evaluate_policy(RandomPolicy(), self.season, self.num_rooms, seeds=seeds, tariff=self.tariff)
+        return result.mean('electricity'), result.mean('gas'), result.mean('cost')
 
 
 if __name__ == "__main__":
     num_households = 100
     num_rooms = 3
-    seasons = ['winter', 'summer']
+    store = CheckpointStore('checkpoints')  # Reuse trained Q-tables across runs
 
-    for season in seasons:
+    for season in SEASONS:
         print(f"Running model for {season}...")
-        model = EnergyModel(num_households, num_rooms, season=season)
-        model.run()
+        model = EnergyModel(num_households, num_rooms, season=season, seed=0)
+        model.run(store=store)
@@ -0,0 +1,107 @@
+from functools import lru_cache
+
+import numpy as np
+
+from batch_energy_environment import BatchEnergyEnvironment
+from observations import ACTION_STATE_SIZE
+
+# The state is the previous action
+STATE_SIZE = ACTION_SIZE = ACTION_STATE_SIZE
+
+
+@lru_cache(maxsize=None)
+def build_tables(season, num_rooms, tariff=None):
+    """
+    Build the reward and transition tables of the energy environment.
+
+    The environment is deterministic: the next state is the action with the fridge forced on and
+    the reward only depends on the action and the hour of the tariff schedule, so the whole MDP
+    fits in two small tables. The rewards are read from BatchEnergyEnvironment so they always match the
+    environment's own accounting.
+
+    Parameters:
+    - season: 'winter' or 'summer'.
+    - num_rooms: Number of rooms in the household.
+    - tariff: Electricity Tariff, the two-rate tariff by default.
+
+    Returns:
+    - Tuple (rewards, next_states) where rewards has shape (num_hours, num_actions) and holds the
+      reward of every flat action at every hour of the tariff schedule (24 for a daily tariff),
+      and next_states has shape (num_actions,) and holds the flat index of the state reached by
+      every flat action.
+    """
+    num_actions = int(np.prod(ACTION_SIZE))
+    actions = np.stack(np.unravel_index(np.arange(num_actions), ACTION_SIZE), axis=1)
+
+    env = BatchEnergyEnvironment(num_actions, num_rooms=num_rooms, season=season, tariff=tariff)
+    num_hours = len(env.tariff.hourly_prices)
+    rewards = np.zeros((num_hours, num_actions))
+    for hour in range(num_hours):
+        env.reset()
+        env.current_day[:] = hour // 24
+        env.current_hour[:] = hour % 24
+        next_states, rewards[hour], _, _ = env.step(actions)
+
+    next_states = np.ravel_multi_index(next_states.T, STATE_SIZE)
+
+    rewards.flags.writeable = False
+    next_states.flags.writeable = False
+    return rewards, next_states
+
+
+def solve_q_table(season, num_rooms, gamma=0.95, hour_conditioned=False, tariff=None, tol=1e-10,
+                  max_iterations=10000):
+    """
+    Solve for the optimal Q-table by value iteration instead of sampled Q-learning.
+
+    Parameters:
+    - season: 'winter' or 'summer'.
+    - num_rooms: Number of rooms in the household.
+    - gamma: Discount factor.
+    - hour_conditioned: If False, the hour is not part of the state and every step uses the
+      reward averaged over the tariff schedule, which gives a table with the same shape as
+      QLearningAgent.q_table. If True, the hour of the day is part of the state, as with the
+      'hour' observation feature, which needs a daily tariff.
+    - tariff: Electricity Tariff, the two-rate tariff by default.
+    - tol: Stop when the largest change of a Q-value between two iterations is below this value.
+    - max_iterations: Upper bound on the number of value iteration sweeps.
+
+    Returns:
+    - The Q-table, with shape STATE_SIZE + ACTION_SIZE, or STATE_SIZE + [24] + ACTION_SIZE when
+      hour_conditioned is True, the layout of a QLearningAgent with the 'hour' feature.
+    """
+    rewards, next_states = build_tables(season, num_rooms, tariff)
+    num_states = int(np.prod(STATE_SIZE))
+
+    if not hour_conditioned:
+        rewards = rewards.mean(axis=0, keepdims=True)
+    elif len(rewards) != 24:
+        raise ValueError("The hour of the day only conditions the Q-table of a daily tariff")
+    num_hours = len(rewards)
+
+    # Q[h, s, a] = R[h, a] + gamma * max_a' Q[h + 1, next_state(a), a']
+    q_values = np.zeros((num_hours, num_states, rewards.shape[1]))
+    for _ in range(max_iterations):
+        state_values = q_values.max(axis=2)
+        next_hour_values = np.roll(state_values, -1, axis=0)
+        action_values = rewards + gamma * next_hour_values[:, next_states]
+        # The reward and the next state only depend on the action, so every state shares the row
+        updated = np.broadcast_to(action_values[:, None, :], q_values.shape)
+        delta = np.max(np.abs(updated - q_values))
+        q_values = updated
+        if delta < tol:
+            break
+
+    q_values = np.ascontiguousarray(q_values)
+    if hour_conditioned:
+        # The hour is observed after the previous action, so it goes between the state and the action axes
+        q_values = np.moveaxis(q_values.reshape([num_hours] + STATE_SIZE + ACTION_SIZE), 0, len(STATE_SIZE))
+        return np.ascontiguousarray(q_values)
+    return q_values.reshape(STATE_SIZE + ACTION_SIZE)
+
+
+def save_q_table(filename, season, num_rooms, gamma=0.95, tariff=None):
+    """
+    Solve the Q-table and save it in the format read by QLearningAgent.load_q_table.
+    """
+    np.save(filename, solve_q_table(season, num_rooms, gamma=gamma, tariff=tariff))
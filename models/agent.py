@@ -1,5 +1,5 @@
 from mesa import Agent
-import numpy as np
+from models.parameters import ENERGY_SAVING_FACTOR, ENERGY_SAVING_PROBABILITY, WINTER_USAGE_FACTOR
 
 
 class Household(Agent):
@@ -7,8 +7,9 @@ class Household(Agent):
         super().__init__(unique_id, model)
         self.house_type = house_type
         self.num_people = num_people
-        self.energy_saving = np.random.choice(['Yes', 'No'], p=[0.3, 0.7])  # 30% of the households engage in energy
-        # savings (Randomly generated)
+        # 30% of the households engage in energy savings (Randomly generated)
+        self.energy_saving = model.rng.choice(['Yes', 'No'],
+                                              p=[ENERGY_SAVING_PROBABILITY, 1 - ENERGY_SAVING_PROBABILITY])
         self.season = model.season
 
         # Initial electricity and gas usage
@@ -18,13 +19,13 @@ class Household(Agent):
     def calculate_energy_usage(self, energy_type):
         # Mean and standard deviation based on house type
         mean, std = self.model.energy_usage_params[self.house_type][energy_type]
-        usage = np.random.normal(mean, std)  # Calculating the usage
+        usage = self.model.rng.normal(mean, std)  # Calculating the usage
         if self.season == 'winter':
             # Energy usage is 36% higher in winter
-            usage *= 1.36
+            usage *= WINTER_USAGE_FACTOR
         if self.energy_saving == 'Yes':
             # If the household is engaged in energy savings, reduce the usage by 10%
-            usage *= 0.9
+            usage *= ENERGY_SAVING_FACTOR
         return max(usage, 0)
 
     '''
@@ -0,0 +1,220 @@
+import glob
+import json
+import os
+
+import numpy as np
+from appliances import SEASONS
+from models.parameters import HOUSE_TYPES
+
+ENERGY_SAVING = ['No', 'Yes']
+
+# Column name, dtype and categories (None for numeric columns) of the collected agent data
+COLUMNS = [
+    ('electricity_usage', np.float32, None),
+    ('gas_usage', np.float32, None),
+    ('house_type', np.int8, HOUSE_TYPES),
+    ('num_people', np.int8, None),
+    ('energy_saving', np.int8, ENERGY_SAVING),
+    ('season', np.int8, SEASONS),
+]
+
+# DataCollector reporter name of every column
+REPORTER_NAMES = {
+    'electricity_usage': "Electricity Usage",
+    'gas_usage': "Gas Usage",
+    'house_type': "House Type",
+    'num_people': "Num People",
+    'energy_saving': "Energy Saving",
+    'season': "Season",
+}
+
+
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ColumnarCollector:
+    def __init__(self, path, num_agents, chunk_steps=1000, file_format='npz'):
+        """
+        Collect per-step agent data into preallocated typed arrays and flush them to disk in shards.
+
+        Categorical fields are stored as small integer codes, and only `chunk_steps` steps are ever
+        held in memory, so long runs use constant memory.
+
+        Parameters:
+        - path: Directory that receives the shards and the metadata file.
+        - num_agents: Number of agents reported on every step.
+        - chunk_steps: Number of steps buffered in memory before a shard is written.
+        - file_format: 'npz', 'parquet' (requires pyarrow) or 'auto' to use Parquet when available.
+        """
+        if file_format == 'auto':
+            file_format = 'parquet' if _parquet_available() else 'npz'
+        if file_format not in ('npz', 'parquet'):
+            raise ValueError("file_format must be 'npz', 'parquet' or 'auto'")
+
+        self.path = path
+        self.num_agents = num_agents
+        self.chunk_steps = chunk_steps
+        self.file_format = file_format
+        os.makedirs(path, exist_ok=True)
+
+        self.steps = np.zeros(chunk_steps, dtype=np.int64)
+        self.buffers = {name: np.zeros((chunk_steps, num_agents), dtype=dtype) for name, dtype, _ in COLUMNS}
+        self.agent_ids = None
+        self.rows = 0
+        self.num_shards = 0
+
+    def collect(self, model):
+        """
+        Copy the current agent data of `model` into the buffers, flushing a shard when they are full.
+
+        The model has to provide `agent_arrays()`, returning a dict of encoded columns and the
+        agent ids, as HouseholdEnergyModel and HouseholdPopulation do.
+        """
+        columns = model.agent_arrays()
+        if self.agent_ids is None:
+            self.agent_ids = np.asarray(columns['agent_id'])
+
+        self.steps[self.rows] = model.schedule.steps if hasattr(model, 'schedule') else model.steps
+        for name, buffer in self.buffers.items():
+            buffer[self.rows] = columns[name]
+        self.rows += 1
+
+        if self.rows == self.chunk_steps:
+            self.flush()
+
+    def flush(self):
+        if self.rows == 0:
+            return
+
+        filename = os.path.join(self.path, f"shard_{self.num_shards:05d}.{self.file_format}")
+        if self.file_format == 'npz':
+            arrays = {name: buffer[:self.rows] for name, buffer in self.buffers.items()}
+            np.savez(filename, step=self.steps[:self.rows], **arrays)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.table({
+                'step': np.repeat(self.steps[:self.rows], self.num_agents),
+                'agent_id': np.tile(self.agent_ids, self.rows),
+                **{name: buffer[:self.rows].reshape(-1) for name, buffer in self.buffers.items()},
+            })
+            pq.write_table(table, filename)
+
+        self.num_shards += 1
+        self.rows = 0
+        self._write_metadata()
+
+    def close(self):
+        """
+        Write the remaining buffered steps and the metadata file.
+        """
+        self.flush()
+        self._write_metadata()
+
+    def _write_metadata(self):
+        metadata = {
+            'num_agents': self.num_agents,
+            'file_format': self.file_format,
+            'num_shards': self.num_shards,
+            'agent_ids': [] if self.agent_ids is None else self.agent_ids.tolist(),
+            'categories': {name: categories for name, _, categories in COLUMNS if categories is not None},
+        }
+        with open(os.path.join(self.path, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f)
+
+
+class ColumnarReader:
+    def __init__(self, path):
+        """
+        Lazily read the shards written by ColumnarCollector, one shard at a time.
+
+        Parameters:
+        - path: Directory written by ColumnarCollector.
+        """
+        self.path = path
+        with open(os.path.join(path, 'metadata.json')) as f:
+            self.metadata = json.load(f)
+        self.num_agents = self.metadata['num_agents']
+        self.agent_ids = np.array(self.metadata['agent_ids'], dtype=np.int64)
+        self.categories = self.metadata['categories']
+        self.shards = sorted(glob.glob(os.path.join(path, f"shard_*.{self.metadata['file_format']}")))
+
+    def iter_chunks(self, columns=None):
+        """
+        Yield one dict per shard with the 'step' array and (steps, num_agents) arrays of the
+        requested columns (all columns by default).
+        """
+        names = columns or [name for name, _, _ in COLUMNS]
+        for shard in self.shards:
+            if self.metadata['file_format'] == 'npz':
+                with np.load(shard) as data:
+                    chunk = {name: data[name] for name in ['step'] + names}
+            else:
+                import pyarrow.parquet as pq
+
+                table = pq.read_table(shard, columns=['step'] + names)
+                chunk = {name: table.column(name).to_numpy().reshape(-1, self.num_agents) for name in names}
+                chunk['step'] = table.column('step').to_numpy()[::self.num_agents]
+            yield chunk
+
+    def decode(self, name, codes):
+        """
+        Turn integer codes of a categorical column back into their labels.
+        """
+        return np.array(self.categories[name])[codes]
+
+    def step_totals(self, column):
+        """
+        Return (steps, totals) with the sum of `column` over all agents at every step.
+        """
+        steps, totals = [], []
+        for chunk in self.iter_chunks([column]):
+            steps.append(chunk['step'])
+            totals.append(chunk[column].sum(axis=1, dtype=np.float64))
+        if not steps:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.concatenate(steps), np.concatenate(totals)
+
+    def mean_by(self, column, by):
+        """
+        Return the mean of `column` over all steps and agents for every category of `by`.
+        """
+        num_categories = len(self.categories[by])
+        sums = np.zeros(num_categories)
+        counts = np.zeros(num_categories)
+        for chunk in self.iter_chunks([column, by]):
+            codes = chunk[by].reshape(-1)
+            sums += np.bincount(codes, weights=chunk[column].reshape(-1), minlength=num_categories)
+            counts += np.bincount(codes, minlength=num_categories)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+        return dict(zip(self.categories[by], means))
+
+    def to_dataframe(self):
+        """
+        Load everything into a DataFrame laid out like DataCollector.get_agent_vars_dataframe.
+        Only use this for data that fits in memory.
+        """
+        import pandas as pd
+
+        frames = []
+        for chunk in self.iter_chunks():
+            num_steps = len(chunk['step'])
+            index = pd.MultiIndex.from_arrays(
+                [np.repeat(chunk['step'], self.num_agents), np.tile(self.agent_ids, num_steps)],
+                names=["Step", "AgentID"]
+            )
+            data = {}
+            for name, _, categories in COLUMNS:
+                values = chunk[name].reshape(-1)
+                data[REPORTER_NAMES[name]] = self.decode(name, values) if categories is not None else values
+            frames.append(pd.DataFrame(data, index=index))
+        if not frames:
+            return pd.DataFrame(columns=list(REPORTER_NAMES.values()))
+        return pd.concat(frames)
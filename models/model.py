@@ -4,10 +4,16 @@ from mesa.space import MultiGrid
 from mesa.datacollection import DataCollector
 import numpy as np
 from models.agent import Household
+from seeding import make_rng, python_random
+from appliances import SEASONS
+from models.parameters import ENERGY_USAGE_PARAMS, HOUSE_TYPES, house_type, sample_household_sizes
 
 
 class HouseholdEnergyModel(Model):
-    def __init__(self, num_households, season):
+    def __init__(self, num_households, season, collector=None, rng=None):
+        # Own NumPy stream for the household attributes and a seeded stdlib stream for mesa's moves
+        self.rng = make_rng(rng)
+        self.random = python_random(self.rng)
         self.num_agents = num_households
         self.season = season
         self.schedule = RandomActivation(self)
@@ -15,15 +21,10 @@ class HouseholdEnergyModel(Model):
         self.running = True  # Model running state
 
         # Energy usage parameters annually (kWh) and their standard deviation
-        self.energy_usage_params = {
-            'Flat/1-bedroom': {'electricity': (1800, 270), 'gas': (7500, 1125)},
-            'Medium 2-3 bedroom': {'electricity': (2700, 405), 'gas': (11500, 1725)},
-            '4+ bedroom': {'electricity': (4100, 615), 'gas': (17000, 2550)}
-        }
+        self.energy_usage_params = ENERGY_USAGE_PARAMS
 
-        # Distribution of household sizes
-        household_sizes = [1]*29 + [2]*47 + [3]*26 + [4]*23 + [5]*9 + [6]*3
-        np.random.shuffle(household_sizes)  # Randomise the houses
+        # Household sizes from the survey, in random order
+        household_sizes = sample_household_sizes(self.rng, num_households).tolist()
 
         for i in range(self.num_agents):
             house_type = self.house_type(household_sizes[i])
@@ -38,6 +39,9 @@ class HouseholdEnergyModel(Model):
             y = self.random.randint(0, self.grid.height - 1)
             self.grid.place_agent(agent, (x, y))
 
+        # Optional ColumnarCollector that replaces the in-memory DataCollector for long runs
+        self.collector = collector
+
         # Initialise the DataCollector to collect specified data from agents
         self.datacollector = DataCollector(
             agent_reporters={
@@ -54,12 +58,7 @@ class HouseholdEnergyModel(Model):
         Return house type based on number of people
     '''
     def house_type(self, num_people):
-        if num_people == 1:
-            return 'Flat/1-bedroom'
-        elif num_people == 2 or num_people == 3:
-            return 'Medium 2-3 bedroom'
-        else:
-            return '4+ bedroom'
+        return house_type(num_people)
 
     '''
         Collect data at each step of the simulation
@@ -67,7 +66,10 @@ class HouseholdEnergyModel(Model):
     def step(self):
         self.schedule.step()
         # Collect data at each step
-        self.datacollector.collect(self)
+        if self.collector is not None:
+            self.collector.collect(self)
+        else:
+            self.datacollector.collect(self)
 
     '''
         Collect data from all agents in the model and Return
@@ -80,3 +82,18 @@ class HouseholdEnergyModel(Model):
                 np.round(agent.gas_usage, 2), agent.energy_saving
             ])
         return data
+
+    '''
+        Return the reporter fields of all agents as encoded columns, ordered by agent id
+    '''
+    def agent_arrays(self):
+        agents = sorted(self.schedule.agents, key=lambda agent: agent.unique_id)
+        return {
+            'agent_id': np.array([agent.unique_id for agent in agents]),
+            'electricity_usage': np.array([agent.electricity_usage for agent in agents]),
+            'gas_usage': np.array([agent.gas_usage for agent in agents]),
+            'house_type': np.array([HOUSE_TYPES.index(agent.house_type) for agent in agents], dtype=np.int8),
+            'num_people': np.array([agent.num_people for agent in agents], dtype=np.int8),
+            'energy_saving': np.array([agent.energy_saving == 'Yes' for agent in agents], dtype=np.int8),
+            'season': np.full(len(agents), SEASONS.index(self.season), dtype=np.int8),
+        }
@@ -0,0 +1,59 @@
+import numpy as np
+
+# Energy usage parameters annually (kWh) and their standard deviation
+ENERGY_USAGE_PARAMS = {
+    'Flat/1-bedroom': {'electricity': (1800, 270), 'gas': (7500, 1125)},
+    'Medium 2-3 bedroom': {'electricity': (2700, 405), 'gas': (11500, 1725)},
+    '4+ bedroom': {'electricity': (4100, 615), 'gas': (17000, 2550)}
+}
+
+HOUSE_TYPES = list(ENERGY_USAGE_PARAMS)
+
+# Number of lit rooms of each house type in the household energy environment
+HOUSE_TYPE_ROOMS = {
+    'Flat/1-bedroom': 2,
+    'Medium 2-3 bedroom': 4,
+    '4+ bedroom': 6
+}
+
+# Distribution of household sizes
+HOUSEHOLD_SIZES = [1]*29 + [2]*47 + [3]*26 + [4]*23 + [5]*9 + [6]*3
+
+ENERGY_SAVING_PROBABILITY = 0.3  # 30% of the households engage in energy savings
+WINTER_USAGE_FACTOR = 1.36  # Energy usage is 36% higher in winter
+ENERGY_SAVING_FACTOR = 0.9  # Energy saving households use 10% less
+OCCUPANCY_USAGE_EXPONENT = 0.5  # Appliance usage grows with the square root of the household size
+REFERENCE_HOUSEHOLD_SIZE = 2  # Household size the energy environment's appliance usage is set for
+
+
+def sample_household_sizes(rng, num_households):
+    '''
+        Shuffle the surveyed household sizes, and sample from the same distribution once the
+        population is larger than the survey
+    '''
+    household_sizes = np.array(HOUSEHOLD_SIZES, dtype=np.int8)
+    if num_households <= len(household_sizes):
+        rng.shuffle(household_sizes)
+        return household_sizes[:num_households]
+    sizes, counts = np.unique(household_sizes, return_counts=True)
+    return rng.choice(sizes, size=num_households, p=counts / counts.sum()).astype(np.int8)
+
+
+def house_type(num_people):
+    '''
+        Return house type based on number of people
+    '''
+    if num_people == 1:
+        return 'Flat/1-bedroom'
+    elif num_people == 2 or num_people == 3:
+        return 'Medium 2-3 bedroom'
+    else:
+        return '4+ bedroom'
+
+
+def occupancy_usage_factor(num_people):
+    '''
+        Return the appliance usage of households of `num_people` relative to the reference household,
+        works on scalars and arrays
+    '''
+    return (num_people / REFERENCE_HOUSEHOLD_SIZE) ** OCCUPANCY_USAGE_EXPONENT
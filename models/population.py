@@ -0,0 +1,163 @@
+import numpy as np
+from appliances import SEASONS
+from seeding import make_rng
+from models.parameters import (ENERGY_SAVING_FACTOR, ENERGY_SAVING_PROBABILITY, ENERGY_USAGE_PARAMS, HOUSE_TYPES,
+                               HOUSEHOLD_SIZES, WINTER_USAGE_FACTOR, house_type, sample_household_sizes)
+
+# Moore neighbourhood offsets, matching MultiGrid.get_neighborhood(moore=True, include_center=False)
+NEIGHBOUR_OFFSETS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)],
+                             dtype=np.int16)
+
+AGENT_REPORTERS = ["Electricity Usage", "Gas Usage", "House Type", "Num People", "Energy Saving", "Season"]
+
+
+class HouseholdPopulation:
+    '''
+        Struct-of-arrays version of HouseholdEnergyModel.
+
+        Every household attribute is a NumPy column instead of a mesa Household object, so one
+        step moves all households and resamples all usage in a few vectorized calls.
+    '''
+    def __init__(self, num_households, season, width=10, height=10, collector=None, rng=None):
+        self.rng = make_rng(rng)
+        self.num_agents = num_households
+        self.season = season
+        self.width = width
+        self.height = height
+        self.steps = 0
+        self.running = True
+        self.collector = collector  # Optional ColumnarCollector, used instead of the in-memory records
+
+        self.energy_usage_params = ENERGY_USAGE_PARAMS
+        self.house_types = np.array(HOUSE_TYPES)
+        self.usage_mean = {
+            energy_type: np.array([ENERGY_USAGE_PARAMS[t][energy_type][0] for t in HOUSE_TYPES], dtype=np.float64)
+            for energy_type in ('electricity', 'gas')
+        }
+        self.usage_std = {
+            energy_type: np.array([ENERGY_USAGE_PARAMS[t][energy_type][1] for t in HOUSE_TYPES], dtype=np.float64)
+            for energy_type in ('electricity', 'gas')
+        }
+
+        self.num_people = sample_household_sizes(self.rng, num_households)
+        people_to_house_type = np.array([HOUSE_TYPES.index(house_type(n)) if n else 0
+                                         for n in range(max(HOUSEHOLD_SIZES) + 1)], dtype=np.int8)
+        self.house_type = people_to_house_type[self.num_people]
+        self.energy_saving = self.rng.random(num_households) < ENERGY_SAVING_PROBABILITY
+
+        # Place every household in a random grid cell
+        self.x = self.rng.integers(0, width, size=num_households).astype(np.int16)
+        self.y = self.rng.integers(0, height, size=num_households).astype(np.int16)
+
+        self.electricity_usage = self.calculate_energy_usage('electricity')
+        self.gas_usage = self.calculate_energy_usage('gas')
+
+        self._collected_steps = []
+        self._collected_usage = []
+
+    def calculate_energy_usage(self, energy_type):
+        '''
+            Sample the annual usage of every household in one call
+        '''
+        mean = self.usage_mean[energy_type][self.house_type]
+        std = self.usage_std[energy_type][self.house_type]
+        usage = self.rng.normal(mean, std)
+        if self.season == 'winter':
+            usage *= WINTER_USAGE_FACTOR
+        usage[self.energy_saving] *= ENERGY_SAVING_FACTOR
+        return np.maximum(usage, 0)
+
+    def move(self):
+        '''
+            Move every household to a random neighbouring cell inside the grid
+        '''
+        pending = np.arange(self.num_agents)
+        new_x = np.empty_like(self.x)
+        new_y = np.empty_like(self.y)
+        # Redraw the offsets that leave the grid, which picks uniformly among the valid neighbours
+        while len(pending):
+            offsets = NEIGHBOUR_OFFSETS[self.rng.integers(len(NEIGHBOUR_OFFSETS), size=len(pending))]
+            x = self.x[pending] + offsets[:, 0]
+            y = self.y[pending] + offsets[:, 1]
+            valid = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+            new_x[pending[valid]] = x[valid]
+            new_y[pending[valid]] = y[valid]
+            pending = pending[~valid]
+        self.x = new_x
+        self.y = new_y
+
+    def step(self):
+        self.move()
+        self.electricity_usage = self.calculate_energy_usage('electricity')
+        self.gas_usage = self.calculate_energy_usage('gas')
+        self.steps += 1
+        if self.collector is not None:
+            self.collector.collect(self)
+        else:
+            self.collect()
+
+    def collect(self):
+        '''
+            Record the usage columns of the current step, the static columns are kept once
+        '''
+        self._collected_steps.append(self.steps)
+        self._collected_usage.append((self.electricity_usage, self.gas_usage))
+
+    def agent_columns(self):
+        '''
+            Return the reporter fields of all households as columns
+        '''
+        return {
+            "Electricity Usage": self.electricity_usage,
+            "Gas Usage": self.gas_usage,
+            "House Type": self.house_types[self.house_type],
+            "Num People": self.num_people,
+            "Energy Saving": np.where(self.energy_saving, 'Yes', 'No'),
+            "Season": np.full(self.num_agents, self.season),
+        }
+
+    def agent_arrays(self):
+        '''
+            Return the reporter fields of all households as encoded columns for ColumnarCollector
+        '''
+        return {
+            'agent_id': np.arange(self.num_agents),
+            'electricity_usage': self.electricity_usage,
+            'gas_usage': self.gas_usage,
+            'house_type': self.house_type,
+            'num_people': self.num_people,
+            'energy_saving': self.energy_saving,
+            'season': np.full(self.num_agents, SEASONS.index(self.season), dtype=np.int8),
+        }
+
+    def get_agent_vars_dataframe(self):
+        '''
+            Return the collected data in the same layout as DataCollector.get_agent_vars_dataframe
+        '''
+        import pandas as pd
+
+        num_steps = len(self._collected_steps)
+        index = pd.MultiIndex.from_arrays(
+            [np.repeat(self._collected_steps, self.num_agents), np.tile(np.arange(self.num_agents), num_steps)],
+            names=["Step", "AgentID"]
+        )
+        columns = self.agent_columns()
+        data = {
+            "Electricity Usage": np.concatenate([usage[0] for usage in self._collected_usage]) if num_steps else [],
+            "Gas Usage": np.concatenate([usage[1] for usage in self._collected_usage]) if num_steps else [],
+        }
+        for name in AGENT_REPORTERS[2:]:
+            data[name] = np.tile(columns[name], num_steps)
+        return pd.DataFrame(data, index=index, columns=AGENT_REPORTERS)
+
+    def collect_data(self):
+        '''
+            Collect data from all households in the model and Return
+        '''
+        return [
+            [house, people, np.round(electricity, 2), np.round(gas, 2), saving]
+            for house, people, electricity, gas, saving in zip(
+                self.house_types[self.house_type].tolist(), self.num_people.tolist(), self.electricity_usage,
+                self.gas_usage, np.where(self.energy_saving, 'Yes', 'No').tolist()
+            )
+        ]
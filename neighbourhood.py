@@ -0,0 +1,166 @@
+import numpy as np
+
+from aggregation import GridLoadAggregator
+from appliances import NUM_HOURS
+from batch_energy_environment import BatchEnergyEnvironment
+from linear_agent import LinearQAgent
+from models.parameters import (ENERGY_USAGE_PARAMS, HOUSE_TYPE_ROOMS, HOUSE_TYPES, WINTER_USAGE_FACTOR,
+                               occupancy_usage_factor)
+from observations import ACTION_STATE_SIZE, state_size
+from q_learning_agent import QLearningAgent
+from seeding import spawn_seeds
+
+# Observation features that tell households of different configurations apart
+HOUSEHOLD_FEATURES = ('hour', 'occupancy', 'num_rooms')
+
+AGENT_TYPES = {'tabular': QLearningAgent, 'linear': LinearQAgent}
+
+
+def household_environments(population, tariff=None, features=HOUSEHOLD_FEATURES):
+    """
+    Build one BatchEnergyEnvironment with a household for every member of a population.
+
+    The house type sets the number of rooms. Appliance usage is scaled by the household size (see
+    occupancy_usage_factor) and by the household's sampled annual usage relative to the mean of its
+    house type, which already includes the reduction of energy saving households.
+
+    Parameters:
+    - population: HouseholdEnergyModel or HouseholdPopulation, read through its agent_arrays().
+    - tariff: Electricity Tariff shared by every household, the two-rate tariff by default.
+    - features: Observation features, see observations.FEATURE_SIZES.
+    """
+    columns = population.agent_arrays()
+    rooms = np.array([HOUSE_TYPE_ROOMS[name] for name in HOUSE_TYPES])[columns['house_type']]
+    mean_usage = np.array([sum(ENERGY_USAGE_PARAMS[name][energy_type][0] for energy_type in ('electricity', 'gas'))
+                           for name in HOUSE_TYPES])[columns['house_type']]
+    if population.season == 'winter':
+        mean_usage = mean_usage * WINTER_USAGE_FACTOR
+    sampled_usage = columns['electricity_usage'] + columns['gas_usage']
+    usage_scale = occupancy_usage_factor(columns['num_people']) * sampled_usage / mean_usage
+    return BatchEnergyEnvironment(len(rooms), num_rooms=rooms, season=population.season, tariff=tariff,
+                                  features=features, num_people=columns['num_people'], usage_scale=usage_scale)
+
+
+class NeighbourhoodDemand:
+    def __init__(self, aggregator):
+        """
+        Aggregate demand of a neighbourhood on every hour of a simulated period.
+
+        - electricity, gas, cost: Arrays of shape (num_hours,) summed over all households.
+        - electricity_by_house_type: Array of shape (num_hours, len(HOUSE_TYPES)).
+        - aggregator: The GridLoadAggregator the demand was streamed into, with peaks and quantiles.
+        """
+        self.aggregator = aggregator
+        self.electricity = aggregator.load_curve('electricity')
+        self.gas = aggregator.load_curve('gas')
+        self.cost = aggregator.load_curve('cost')
+        self.electricity_by_house_type = aggregator.group_load_curve()
+
+    @property
+    def peak_hour(self):
+        return int(np.argmax(self.electricity))
+
+    @property
+    def peak_load(self):
+        return float(self.electricity[self.peak_hour])
+
+    def daily_profile(self):
+        """
+        Return the mean electricity demand of every hour of the day, shape (24,).
+        """
+        return self.aggregator.daily_profile()
+
+
+class NeighbourhoodController:
+    def __init__(self, population, tariff=None, features=HOUSEHOLD_FEATURES, per_house_type=False,
+                 agent_type='linear', alpha=0.1, gamma=0.95, epsilon=0.05, rng=None):
+        """
+        Control every household of a population with Q-learning, all households stepped together.
+
+        Each household drives its own environment, see `household_environments`. One shared
+        policy controls all households, or with `per_house_type` one policy per house type.
+        Policies act and learn on their households as a single batch every hour.
+
+        Parameters:
+        - population: HouseholdEnergyModel or HouseholdPopulation.
+        - tariff: Electricity Tariff, the two-rate tariff by default.
+        - features: Observation features handed to the policies.
+        - per_house_type: Train a separate policy for every house type.
+        - agent_type: 'tabular' for QLearningAgent or 'linear' for LinearQAgent.
+        - alpha, gamma, epsilon: Agent hyperparameters.
+        - rng: Seed for the agents' exploration, every policy gets its own stream.
+        """
+        if agent_type not in AGENT_TYPES:
+            raise ValueError(f"agent_type must be one of {list(AGENT_TYPES)}")
+        self.population = population
+        self.tariff = tariff
+        self.features = tuple(features)
+        self.env = household_environments(population, tariff=tariff, features=self.features)
+        self.house_type = population.agent_arrays()['house_type'].astype(np.int64)
+
+        # Rows of the batch controlled by every policy
+        if per_house_type:
+            self.groups = [np.nonzero(self.house_type == i)[0] for i in range(len(HOUSE_TYPES))]
+            self.groups = [rows for rows in self.groups if len(rows)]
+        else:
+            self.groups = [np.arange(self.env.num_envs)]
+        self.agents = [
+            AGENT_TYPES[agent_type](state_size=state_size(self.features), action_size=list(ACTION_STATE_SIZE),
+                                    alpha=alpha, gamma=gamma, epsilon=epsilon, rng=seed)
+            for seed in spawn_seeds(rng, len(self.groups))
+        ]
+        self.actions = np.zeros((self.env.num_envs, len(ACTION_STATE_SIZE)), dtype=np.int64)
+
+    def _act(self, states, greedy):
+        for agent, rows in zip(self.agents, self.groups):
+            if greedy:
+                self.actions[rows] = agent.greedy_actions(states[rows])
+            else:
+                self.actions[rows] = agent.choose_actions(states[rows])
+        return self.actions
+
+    def train(self, episodes=10):
+        """
+        Train the policies for `episodes` seasons of the whole neighbourhood.
+        """
+        env = self.env
+        for episode in range(episodes):
+            states = env.reset()
+            done = False
+            while not done:
+                actions = self._act(states, greedy=False)
+                next_states, rewards, dones, _ = env.step(actions)
+                for agent, rows in zip(self.agents, self.groups):
+                    agent.learn_batch(states[rows], actions[rows], rewards[rows], next_states[rows])
+                states = next_states
+                done = dones.all()
+
+    def simulate(self, policy=None, hours=NUM_HOURS, top_k=10):
+        """
+        Run the greedy policies and stream the usage of every household into a GridLoadAggregator.
+
+        Parameters:
+        - policy: Optional policy from evaluation, such as RandomPolicy, used instead of the
+          trained agents for a baseline. It is reset with one seed per household.
+        - hours: Number of simulated hours, a year is 8760. Households are never stored per hour,
+          so long runs only cost memory for the hourly aggregate curves.
+        - top_k: Number of peak hours kept by the aggregator.
+
+        Returns:
+        - NeighbourhoodDemand.
+        """
+        env = self.env
+        states = env.reset()
+        if policy is not None:
+            policy.reset(range(env.num_envs))
+
+        aggregator = GridLoadAggregator(env.num_envs, groups=self.house_type, num_groups=len(HOUSE_TYPES),
+                                        top_k=top_k)
+        for step in range(hours):
+            if policy is None:
+                actions = self._act(states, greedy=True)
+            else:
+                actions = policy(states, env, step)
+            states, _, _, info = env.step(actions)
+            aggregator.add(info['electricity_used'], info['gas_used'], info['electricity_cost'] + info['gas_cost'])
+        return NeighbourhoodDemand(aggregator)
@@ -0,0 +1,77 @@
+import numpy as np
+
+from appliances import SEASONS
+
+# Discrete size of every optional observation feature, appended after the previous action
+FEATURE_SIZES = {
+    'hour': 24,
+    'day_of_week': 7,
+    'temperature': 4,
+    'occupancy': 6,
+    'num_rooms': 6,
+    'season': 2,
+}
+
+ACTION_STATE_SIZE = [2, 2, 2, 2, 2]
+
+# Outdoor temperature model (°C): seasonal mean plus a daily swing peaking mid-afternoon
+SEASONAL_TEMPERATURE = {'winter': 5.0, 'summer': 18.0}
+DAILY_TEMPERATURE_SWING = 4.0
+TEMPERATURE_BUCKET_EDGES = [0.0, 10.0, 20.0]
+
+
+def state_size(features=()):
+    """
+    Return the state size list of an observation with the given features.
+    """
+    for feature in features:
+        if feature not in FEATURE_SIZES:
+            raise ValueError(f"Unknown observation feature {feature!r}, expected one of {list(FEATURE_SIZES)}")
+    return ACTION_STATE_SIZE + [FEATURE_SIZES[feature] for feature in features]
+
+
+def hourly_temperature(season, hour):
+    """
+    Return the modelled outdoor temperature for every hour of the day, works on arrays.
+    """
+    return SEASONAL_TEMPERATURE[season] + DAILY_TEMPERATURE_SWING * np.sin((np.asarray(hour) - 9) * np.pi / 12)
+
+
+def feature_values(feature, season, hour, day, num_people, num_rooms):
+    """
+    Return the discretized value of one feature, works on scalars and arrays.
+    """
+    if feature == 'hour':
+        return np.asarray(hour)
+    if feature == 'day_of_week':
+        return np.asarray(day) % 7
+    if feature == 'temperature':
+        return np.digitize(hourly_temperature(season, hour), TEMPERATURE_BUCKET_EDGES)
+    if feature == 'occupancy':
+        return np.clip(np.asarray(num_people), 1, FEATURE_SIZES['occupancy']) - 1
+    if feature == 'num_rooms':
+        return np.clip(np.asarray(num_rooms), 1, FEATURE_SIZES['num_rooms']) - 1
+    if feature == 'season':
+        return np.asarray(SEASONS.index(season))
+    raise ValueError(f"Unknown observation feature {feature!r}")
+
+
+def encode(state, features, season, hour, day, num_people, num_rooms):
+    """
+    Append the requested features to the previous-action state.
+
+    Parameters:
+    - state: The previous action, shape (5,) or (n, 5) for a batch of households.
+    - features: Names of the features to append, in order, see FEATURE_SIZES.
+    - season, hour, day, num_people, num_rooms: The values the features are computed from,
+      scalars or arrays of shape (n,).
+
+    Returns:
+    - Integer array of shape (5 + len(features),) or (n, 5 + len(features)).
+    """
+    state = np.asarray(state)
+    if not features:
+        return state
+    columns = [np.broadcast_to(feature_values(feature, season, hour, day, num_people, num_rooms), state.shape[:-1])
+               for feature in features]
+    return np.concatenate([state, np.stack(columns, axis=-1).astype(state.dtype)], axis=-1)
@@ -1,7 +1,16 @@
 import numpy as np
+from q_storage import SparseQTable
+from seeding import make_rng
+
+# Number of exploration draws generated at once by choose_action
+NOISE_BLOCK_SIZE = 4096
+
+# Largest dense Q-table allocated by the 'auto' storage mode
+MAX_DENSE_BYTES = 64 * 1024 * 1024
 
 class QLearningAgent:
-    def __init__(self, state_size, action_size, alpha=0.1, gamma=0.95, epsilon=0.05):
+    def __init__(self, state_size, action_size, alpha=0.1, gamma=0.95, epsilon=0.05, rng=None, storage='auto',
+                 max_states=None):
         """
         Initialize the Q-learning agent.
 
@@ -12,15 +21,39 @@ class QLearningAgent:
         - alpha: Learning rate (how fast the agent updates Q-values).
         - gamma: Discount factor (how much future rewards are considered).
         - epsilon: Exploration rate (probability of taking a random action).
+        - rng: Seed or numpy.random.Generator used for exploration, see seeding.make_rng.
+        - storage: 'dense' for a full Q-table, 'sparse' for a SparseQTable that only stores visited
+          states, or 'auto' to use the dense table when it fits in MAX_DENSE_BYTES.
+        - max_states: Bound on the number of states kept by the sparse table.
         """
         self.state_size = state_size
         self.action_size = action_size
         self.alpha = alpha  # Learning rate
         self.gamma = gamma  # Discount factor
         self.epsilon = epsilon  # Exploration rate
+        self.rng = make_rng(rng)
+
+        # Exploration noise is drawn in blocks instead of one value per call
+        self._noise = np.zeros(0)
+        self._random_actions = np.zeros(0, dtype=np.int64)
+        self._noise_position = 0
+
+        num_states = int(np.prod(state_size, dtype=object))
+        num_actions = int(np.prod(action_size))
+        if storage == 'auto':
+            storage = 'dense' if num_states * num_actions * 8 <= MAX_DENSE_BYTES else 'sparse'
+        if storage not in ('dense', 'sparse'):
+            raise ValueError("storage must be 'dense', 'sparse' or 'auto'")
+        self.storage = storage
 
-        # Initialize Q-table with zeros. The shape of the Q-table is state_size + action_size.
-        self.q_table = np.zeros(state_size + action_size)
+        if storage == 'dense':
+            # Initialize Q-table with zeros. The shape of the Q-table is state_size + action_size.
+            self.q_table = np.zeros(state_size + action_size)
+            self.sparse_table = None
+        else:
+            # Only the rows of visited states are stored, the dense q_table is not available
+            self.q_table = None
+            self.sparse_table = SparseQTable(num_actions, max_states=max_states)
 
     def _state_index(self, state):
         """
@@ -46,13 +79,26 @@ class QLearningAgent:
         """
         return tuple(action)
 
+    def _refill_noise(self):
+        self._noise = self.rng.random(NOISE_BLOCK_SIZE)
+        self._random_actions = self.rng.integers(int(np.prod(self.action_size)), size=NOISE_BLOCK_SIZE)
+        self._noise_position = 0
+
     def choose_action(self, state):
+        if self.sparse_table is not None:
+            return self.choose_actions(np.asarray(state)[None])[0].tolist()
+
         state_index = self._state_index(state)
 
-        if np.random.rand() < self.epsilon:
+        if self._noise_position == len(self._noise):
+            self._refill_noise()
+        position = self._noise_position
+        self._noise_position += 1
+
+        if self._noise[position] < self.epsilon:
             # Explore: random action for each appliance
-            action = [np.random.randint(self.action_size[i]) for i in range(len(self.action_size))]
-            return action
+            action = np.unravel_index(self._random_actions[position], self.action_size)
+            return [int(a) for a in action]
 
         # Exploit: best action for each appliance
         q_values = self.q_table[state_index]
@@ -76,7 +122,14 @@ class QLearningAgent:
         - action: The action taken (list of integers, representing both electricity and gas actions).
         - reward: The reward received after taking the action.
         - next_state: The state of the environment after taking the action.
+
+        Returns:
+        - The TD error of the update.
         """
+        if self.sparse_table is not None:
+            return self.learn_batch(np.asarray(state)[None], np.asarray(action)[None], np.array([reward]),
+                                    np.asarray(next_state)[None])[0]
+
         state_index = self._state_index(state)
         action_index = self._action_index(action)
         next_state_index = self._state_index(next_state)
@@ -86,7 +139,122 @@ class QLearningAgent:
         next_max_q = np.max(self.q_table[next_state_index])  # Max Q-value for the next state
 
         # Update the Q-value for the action taken
-        self.q_table[state_index][action_index] = current_q + self.alpha * (reward + self.gamma * next_max_q - current_q)
+        td_error = reward + self.gamma * next_max_q - current_q
+        self.q_table[state_index][action_index] = current_q + self.alpha * td_error
+        return td_error
+
+    def _flat_q_table(self):
+        """
+        Return a (num_states, num_actions) view of the Q-table for vectorized lookups.
+        """
+        return self.q_table.reshape(int(np.prod(self.state_size)), int(np.prod(self.action_size)))
+
+    def _flat_state_indices(self, states):
+        """
+        Convert an array of states with shape (n, len(state_size)) to flat row indices.
+        """
+        return np.ravel_multi_index(np.asarray(states).T, self.state_size)
+
+    def _flat_action_indices(self, actions):
+        """
+        Convert an array of actions with shape (n, len(action_size)) to flat column indices.
+        """
+        return np.ravel_multi_index(np.asarray(actions).T, self.action_size)
+
+    def _q_rows(self, state_indices):
+        """
+        Return the Q-value rows of flat state indices, shape (n, num_actions), from either storage.
+        """
+        if self.sparse_table is not None:
+            return self.sparse_table.rows(state_indices)
+        return self._flat_q_table()[state_indices]
+
+    def memory_bytes(self):
+        """
+        Return the memory used by the Q-values in bytes.
+        """
+        if self.sparse_table is not None:
+            return self.sparse_table.nbytes
+        return self.q_table.nbytes
+
+    def choose_actions(self, states):
+        """
+        Choose an epsilon-greedy action for every state in a batch.
+
+        Parameters:
+        - states: Integer array of shape (n, len(state_size)), one row per environment.
+
+        Returns:
+        - Integer array of shape (n, len(action_size)) with one action per environment.
+        """
+        state_indices = self._flat_state_indices(states)
+        num_envs = len(state_indices)
+
+        # Exploit: best flat action for each state
+        action_indices = np.argmax(self._q_rows(state_indices), axis=1)
+
+        # Explore: a uniformly random flat action is the same as a random value per appliance
+        explore = self.rng.random(num_envs) < self.epsilon
+        action_indices[explore] = self.rng.integers(int(np.prod(self.action_size)), size=int(explore.sum()))
+
+        return np.stack(np.unravel_index(action_indices, self.action_size), axis=1)
+
+    def greedy_actions(self, states):
+        """
+        Return the best known action for every state in a batch, without exploration.
+
+        Parameters:
+        - states: Integer array of shape (n, len(state_size)).
+
+        Returns:
+        - Integer array of shape (n, len(action_size)).
+        """
+        action_indices = np.argmax(self._q_rows(self._flat_state_indices(states)), axis=1)
+        return np.stack(np.unravel_index(action_indices, self.action_size), axis=1)
+
+    def learn_batch(self, states, actions, rewards, next_states):
+        """
+        Apply the Q-learning update for a batch of transitions from parallel environments.
+
+        All TD errors are computed against the Q-table as it was before the batch. When several
+        transitions hit the same (state, action) pair, the pair is updated once with the mean of
+        their TD errors, so the result does not depend on the order of the batch.
+
+        Parameters:
+        - states: Integer array of shape (n, len(state_size)).
+        - actions: Integer array of shape (n, len(action_size)).
+        - rewards: Array of shape (n,).
+        - next_states: Integer array of shape (n, len(state_size)).
+
+        Returns:
+        - Array of shape (n,) with the TD error of every transition.
+        """
+        state_indices = self._flat_state_indices(states)
+        action_indices = self._flat_action_indices(actions)
+        next_state_indices = self._flat_state_indices(next_states)
+
+        current_q = self._q_rows(state_indices)[np.arange(len(state_indices)), action_indices]
+        next_max_q = np.max(self._q_rows(next_state_indices), axis=1)
+        td_errors = rewards + self.gamma * next_max_q - current_q
+
+        if self.sparse_table is not None:
+            # Average the TD errors of colliding (state, action) pairs
+            pairs, inverse = np.unique(np.stack([state_indices, action_indices]), axis=1, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            td_means = np.bincount(inverse, weights=td_errors) / np.bincount(inverse)
+            self.sparse_table.add(pairs[0], pairs[1], self.alpha * td_means)
+            return td_errors
+
+        # Average the TD errors of colliding (state, action) pairs
+        q_table = self._flat_q_table()
+        num_actions = q_table.shape[1]
+        pair_indices = state_indices * num_actions + action_indices
+        td_sums = np.bincount(pair_indices, weights=td_errors)
+        counts = np.bincount(pair_indices)
+        updated = np.nonzero(counts)[0]
+
+        q_table.reshape(-1)[updated] += self.alpha * td_sums[updated] / counts[updated]
+        return td_errors
 
     def update_epsilon(self, decay_rate):
         """
@@ -102,15 +270,25 @@ class QLearningAgent:
         Save the Q-table to a file for later use.
 
         Parameters:
-        - filename: The path to the file where the Q-table will be saved.
+        - filename: The path to the file where the Q-table will be saved. A sparse table is saved
+          with np.savez, so its file name should end in .npz.
         """
+        if self.sparse_table is not None:
+            np.savez(filename, **self.sparse_table.to_dict())
+            return
         np.save(filename, self.q_table)
 
-    def load_q_table(self, filename):
+    def load_q_table(self, filename, mmap_mode=None):
         """
         Load the Q-table from a file.
 
         Parameters:
         - filename: The path to the file where the Q-table is saved.
+        - mmap_mode: Passed to np.load, use 'r' to share a read-only Q-table between processes.
+          A memory-mapped Q-table can be used to act but not to learn.
         """
-        self.q_table = np.load(filename)
+        if self.sparse_table is not None:
+            with np.load(filename) as data:
+                self.sparse_table.load_dict(data)
+            return
+        self.q_table = np.load(filename, mmap_mode=mmap_mode)
@@ -0,0 +1,136 @@
+import numpy as np
+
+
+class SparseQTable:
+    def __init__(self, num_actions, max_states=None, initial_capacity=1024):
+        """
+        Hash-mapped Q-table that only stores rows for states that have been updated.
+
+        Rows live in a preallocated array that doubles in size as states are added. With
+        `max_states` set, memory is bounded: once the table is full, adding a new state evicts the
+        least recently used one. States without a row read as all-zero Q-values.
+
+        Parameters:
+        - num_actions: Number of flat actions, the length of every row.
+        - max_states: Maximum number of stored states, or None for no limit.
+        - initial_capacity: Number of rows allocated up front.
+        """
+        if max_states is not None:
+            initial_capacity = min(initial_capacity, max_states)
+        self.num_actions = num_actions
+        self.max_states = max_states
+        self.index = {}  # Flat state index -> row slot
+        self.values = np.zeros((initial_capacity, num_actions))
+        self.slot_keys = np.full(initial_capacity, -1, dtype=np.int64)
+        self.last_used = np.zeros(initial_capacity, dtype=np.int64)
+        self.size = 0
+        self.clock = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        # Row storage plus a rough estimate of the dict entries
+        return self.values.nbytes + self.slot_keys.nbytes + self.last_used.nbytes + 100 * len(self.index)
+
+    def _lookup(self, keys):
+        index = self.index
+        return np.array([index.get(key, -1) for key in keys.tolist()], dtype=np.int64)
+
+    def _touch(self, slots):
+        self.clock += 1
+        self.last_used[slots] = self.clock
+
+    def rows(self, keys):
+        """
+        Return the Q-value rows of the given flat states, shape (len(keys), num_actions).
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        slots = self._lookup(keys)
+        found = slots >= 0
+        rows = np.zeros((len(keys), self.num_actions))
+        rows[found] = self.values[slots[found]]
+        self._touch(slots[found])
+        return rows
+
+    def add(self, keys, actions, deltas):
+        """
+        Add `deltas` to the Q-values of the (flat state, flat action) pairs, creating rows as needed.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        if self.max_states is not None and len(np.unique(keys)) > self.max_states:
+            raise ValueError(f"Cannot update {len(np.unique(keys))} states of a table bounded to {self.max_states}")
+        slots = self._lookup(keys)
+        missing = slots < 0
+        self._touch(slots[~missing])
+        if missing.any():
+            new_keys, inverse = np.unique(keys[missing], return_inverse=True)
+            # Rows already used by this update are never evicted to make room for its new states
+            slots[missing] = self._insert(new_keys, keep=slots[~missing])[inverse]
+        np.add.at(self.values, (slots, actions), deltas)
+        self._touch(slots)
+
+    def _insert(self, keys, keep=None):
+        num_new = len(keys)
+        if self.max_states is not None and num_new > self.max_states:
+            raise ValueError(f"Cannot add {num_new} states to a table bounded to {self.max_states}")
+
+        capacity = len(self.values)
+        if self.size + num_new > capacity and (self.max_states is None or capacity < self.max_states):
+            self._grow(self.size + num_new)
+            capacity = len(self.values)
+
+        free = min(capacity - self.size, num_new)
+        slots = np.arange(self.size, self.size + free)
+        if free < num_new:
+            # Evict the least recently used rows to make room, except the rows in `keep`
+            candidates = np.arange(self.size)
+            if keep is not None:
+                candidates = np.setdiff1d(candidates, keep)
+            if len(candidates) < num_new - free:
+                raise ValueError(f"Cannot add {num_new} states to a table bounded to {self.max_states}")
+            order = np.argpartition(self.last_used[candidates], num_new - free - 1)[:num_new - free]
+            evicted = candidates[order]
+            for key in self.slot_keys[evicted].tolist():
+                del self.index[key]
+            self.values[evicted] = 0
+            self.evictions += len(evicted)
+            slots = np.concatenate([slots, evicted])
+        self.size += free
+
+        self.slot_keys[slots] = keys
+        for key, slot in zip(keys.tolist(), slots.tolist()):
+            self.index[key] = slot
+        return slots
+
+    def _grow(self, required):
+        capacity = len(self.values)
+        while capacity < required:
+            capacity *= 2
+        if self.max_states is not None:
+            capacity = min(capacity, self.max_states)
+        grown = len(self.values)
+        self.values = np.concatenate([self.values, np.zeros((capacity - grown, self.num_actions))])
+        self.slot_keys = np.concatenate([self.slot_keys, np.full(capacity - grown, -1, dtype=np.int64)])
+        self.last_used = np.concatenate([self.last_used, np.zeros(capacity - grown, dtype=np.int64)])
+
+    def to_dict(self):
+        """
+        Return the stored rows as arrays, for saving with np.savez.
+        """
+        return {
+            'keys': self.slot_keys[:self.size].copy(),
+            'values': self.values[:self.size].copy(),
+        }
+
+    def load_dict(self, data):
+        keys = np.asarray(data['keys'], dtype=np.int64)
+        self.index = {}
+        self.values = np.zeros((max(len(keys), 1), self.num_actions))
+        self.slot_keys = np.full(len(self.values), -1, dtype=np.int64)
+        self.last_used = np.zeros(len(self.values), dtype=np.int64)
+        self.size = 0
+        slots = self._insert(keys)
+        self.values[slots] = data['values']
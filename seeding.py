@@ -0,0 +1,49 @@
+import random
+
+import numpy as np
+
+
+def make_rng(seed=None):
+    """
+    Return a numpy.random.Generator for `seed`.
+
+    Parameters:
+    - seed: None for fresh entropy, an int, a numpy.random.SeedSequence, or an existing
+      Generator, which is returned unchanged so components can share a stream on purpose.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+def spawn_seeds(seed, n):
+    """
+    Split `seed` into `n` independent SeedSequences, e.g. one per worker process.
+
+    `seed` may also be a Generator, whose own SeedSequence is split.
+    """
+    if isinstance(seed, np.random.Generator):
+        seed = seed.bit_generator.seed_seq
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+
+def component_rngs(seed, names):
+    """
+    Give every named component (env, agent, model, ...) its own independent Generator.
+
+    The streams only depend on `seed` and the position of the name in `names`, so the same seed
+    always reproduces the same draws for every component.
+
+    Returns:
+    - Dict mapping every name to a numpy.random.Generator.
+    """
+    return {name: np.random.default_rng(child) for name, child in zip(names, spawn_seeds(seed, len(names)))}
+
+
+def python_random(rng):
+    """
+    Return a random.Random seeded from `rng`, for libraries such as mesa that use the standard library.
+    """
+    return random.Random(int(rng.integers(2**63)))
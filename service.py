@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from appliances import SEASONS
+from checkpoint import config_key
+from tariff import Tariff, two_rate_tariff
+
+# Fields every scenario request must have
+REQUIRED_FIELDS = ('season', 'num_rooms')
+
+# Defaults of the optional fields of a scenario request, seeds None means rollout seeds derived from the seed
+REQUEST_DEFAULTS = {
+    'num_people': 2,
+    'energy_saving': False,
+    'tariff': None,
+    'seed': 0,
+    'seeds': None,
+    'exact': False,
+    'episodes': 2000,
+}
+
+
+class ServiceBusy(Exception):
+    '''
+        Raised when too many scenarios are already waiting for a worker
+    '''
+
+
+def parse_tariff(tariff):
+    '''
+        Build a Tariff from a request field: None for the two-rate tariff, a Tariff, a dict with
+        'prices' (pence per kWh, see Tariff), or a dict with 'rates' and 'default' (see Tariff.from_schedule)
+    '''
+    if tariff is None:
+        return two_rate_tariff()
+    if isinstance(tariff, Tariff):
+        return tariff
+    name = tariff.get('name', 'custom')
+    if 'prices' in tariff:
+        return Tariff(tariff['prices'], name=name)
+    if 'rates' in tariff:
+        return Tariff.from_schedule([tuple(rate) for rate in tariff['rates']], tariff['default'],
+                                    slots_per_day=tariff.get('slots_per_day', 24), name=name)
+    raise ValueError("A tariff needs either 'prices' or 'rates' and 'default'")
+
+
+def normalize_request(request):
+    '''
+        Fill in the defaults of a scenario request and return (scenario, tariff), where the
+        scenario only holds JSON values, with the tariff replaced by its fingerprint
+    '''
+    missing = [field for field in REQUIRED_FIELDS if field not in request]
+    if missing:
+        raise ValueError(f"Scenario request is missing {missing}")
+    unknown = sorted(set(request) - set(REQUIRED_FIELDS) - set(REQUEST_DEFAULTS))
+    if unknown:
+        raise ValueError(f"Scenario request has unknown fields {unknown}")
+    if request['season'] not in SEASONS:
+        raise ValueError(f"Season must be one of {SEASONS}")
+
+    scenario = dict(REQUEST_DEFAULTS)
+    scenario.update(request)
+    tariff = parse_tariff(scenario['tariff'])
+    scenario['tariff'] = tariff.fingerprint()
+    scenario['num_rooms'] = int(scenario['num_rooms'])
+    scenario['num_people'] = int(scenario['num_people'])
+    scenario['energy_saving'] = bool(scenario['energy_saving'])
+    if scenario['seeds'] is not None:
+        scenario['seeds'] = [int(seed) for seed in scenario['seeds']]
+    return scenario, tariff
+
+
+def answer_scenario(scenario, tariff, checkpoint_dir=None):
+    '''
+        Train (or solve) the agent of a scenario and evaluate it against a random policy.
+        Runs in a worker process of ScenarioService.
+
+        The Q-table only depends on the season, room count, tariff and training settings, so with
+        a checkpoint directory it is trained once and reused for every household of that scenario.
+        The household size and energy saving only change the usage the agent is evaluated on.
+    '''
+    from convergence import ConvergenceCriterion, DecaySchedule
+    from evaluation import GreedyPolicy, RandomPolicy, evaluate_policies
+    from main import EnergyModel
+    from models.parameters import ENERGY_SAVING_FACTOR, occupancy_usage_factor
+
+    model = EnergyModel(0, scenario['num_rooms'], scenario['season'], tariff=tariff, seed=scenario['seed'])
+    episodes_trained = 0
+    if scenario['exact']:
+        model.solve_agent()
+    else:
+        store = None
+        if checkpoint_dir is not None:
+            from checkpoint import CheckpointStore
+
+            store = CheckpointStore(checkpoint_dir)
+        report = model.train_agent(scenario['episodes'], num_envs=64, store=store,
+                                   convergence=ConvergenceCriterion(tolerance=5e-3),
+                                   alpha_schedule=DecaySchedule(0.995, 0.01))
+        episodes_trained = report.episodes_run
+
+    # The household size and energy saving scale the appliance usage the agent is evaluated on
+    usage_scale = occupancy_usage_factor(scenario['num_people'])
+    if scenario['energy_saving']:
+        usage_scale *= ENERGY_SAVING_FACTOR
+    policies = {'trained': GreedyPolicy(model.q_learning_agent), 'random': RandomPolicy()}
+    seeds = model.rollout_seeds() if scenario['seeds'] is None else scenario['seeds']
+    results = evaluate_policies(policies, scenario['season'], scenario['num_rooms'], seeds=seeds,
+                                tariff=tariff, usage_scale=usage_scale)
+
+    answer = {'scenario': scenario, 'tariff_name': tariff.name, 'episodes_trained': episodes_trained}
+    for name, result in results.items():
+        for field in ('electricity', 'gas', 'cost'):
+            answer[f'{field}_{name}'] = float(result.mean(field))
+    answer['cost_saving'] = answer['cost_random'] - answer['cost_trained']
+    return answer
+
+
+class ScenarioService:
+    def __init__(self, cache_dir='scenario_cache', cache_size=1024, max_workers=2, max_pending=64,
+                 checkpoint_dir='checkpoints', executor=None):
+        """
+        Answer scenario requests from asyncio code, from a cache when possible.
+
+        Results are looked up in an in-memory LRU cache, then in `cache_dir` (one JSON file per
+        scenario hash). Identical requests that are already being computed share the same job.
+        Cache misses run `answer_scenario` on a process pool, at most `max_workers` at a time;
+        when `max_pending` scenarios are already waiting or running, new misses raise ServiceBusy
+        instead of queueing without bound.
+
+        Parameters:
+        - cache_dir: Directory of the on-disk result cache, created if needed, or None.
+        - cache_size: Number of results kept in memory.
+        - max_workers: Number of scenarios computed at the same time.
+        - max_pending: Largest number of distinct scenarios waiting for or running on a worker.
+        - checkpoint_dir: CheckpointStore directory shared by the workers, or None.
+        - executor: Optional concurrent.futures executor to use instead of a new process pool.
+        """
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.cache_size = cache_size
+        self.max_pending = max_pending
+        self.checkpoint_dir = checkpoint_dir
+        self.owns_executor = executor is None
+        self.executor = executor or ProcessPoolExecutor(max_workers=max_workers)
+        self.slots = asyncio.Semaphore(max_workers)
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        self.stats = {'requests': 0, 'memory_hits': 0, 'disk_hits': 0, 'deduplicated': 0, 'computed': 0,
+                      'rejected': 0}
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _remember(self, key, answer):
+        self.cache[key] = answer
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _read_disk(self, key):
+        if self.cache_dir is None or not os.path.exists(self._cache_path(key)):
+            return None
+        # A corrupt or truncated file counts as a miss, the answer is computed and written again
+        try:
+            with open(self._cache_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, answer):
+        if self.cache_dir is None:
+            return
+        # Written to a unique temporary file and renamed, so readers never see a partial file even
+        # with several services sharing the cache directory
+        handle, temporary_path = tempfile.mkstemp(prefix=f"{key}.", suffix='.tmp', dir=self.cache_dir)
+        with os.fdopen(handle, 'w') as f:
+            json.dump(answer, f)
+        os.replace(temporary_path, self._cache_path(key))
+
+    async def request(self, request):
+        """
+        Return the answer of a scenario request, see `normalize_request` and `answer_scenario`.
+
+        Parameters:
+        - request: Dict with season and num_rooms, and optionally num_people, energy_saving,
+          tariff, seed, seeds, exact and episodes.
+        """
+        self.stats['requests'] += 1
+        scenario, tariff = normalize_request(request)
+        key = config_key(scenario)
+
+        if key in self.cache:
+            self.stats['memory_hits'] += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        if key in self.in_flight:
+            self.stats['deduplicated'] += 1
+            return await asyncio.shield(self.in_flight[key])
+
+        answer = self._read_disk(key)
+        if answer is not None:
+            self.stats['disk_hits'] += 1
+            self._remember(key, answer)
+            return answer
+
+        if len(self.in_flight) >= self.max_pending:
+            self.stats['rejected'] += 1
+            raise ServiceBusy(f"{len(self.in_flight)} scenarios are already pending")
+
+        job = asyncio.ensure_future(self._compute(key, scenario, tariff))
+        self.in_flight[key] = job
+        return await asyncio.shield(job)
+
+    async def _compute(self, key, scenario, tariff):
+        try:
+            async with self.slots:
+                loop = asyncio.get_running_loop()
+                answer = await loop.run_in_executor(self.executor, answer_scenario, scenario, tariff,
+                                                    self.checkpoint_dir)
+            self.stats['computed'] += 1
+            self._write_disk(key, answer)
+            self._remember(key, answer)
+            return answer
+        finally:
+            del self.in_flight[key]
+
+    async def request_many(self, requests):
+        """
+        Answer several requests concurrently, in order. Failed requests return their exception.
+        """
+        return await asyncio.gather(*(self.request(request) for request in requests), return_exceptions=True)
+
+    def close(self):
+        if self.owns_executor:
+            self.executor.shutdown()
+
+    async def handle_connection(self, reader, writer):
+        # One JSON request per line in, one JSON answer per line out
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = {'result': await self.request(json.loads(line))}
+                except Exception as error:
+                    response = {'error': f"{type(error).__name__}: {error}"}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        """
+        Serve requests over TCP as JSON lines until cancelled.
+        """
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
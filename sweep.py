@@ -0,0 +1,139 @@
+import argparse
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from appliances import SEASONS
+from main import EnergyModel
+
+RESULT_FIELDS = [
+    'season', 'num_rooms', 'alpha', 'gamma', 'epsilon', 'seed',
+    'electricity_trained', 'gas_trained', 'cost_trained',
+    'electricity_random', 'gas_random', 'cost_random',
+    'cost_reduction', 'q_table_file',
+]
+
+
+def scenario_grid(seasons, num_rooms, alphas, gammas, epsilons, seeds):
+    """
+    Build one scenario per combination of the given hyperparameter values.
+
+    Returns:
+    - List of dicts with the keys season, num_rooms, alpha, gamma, epsilon and seed.
+    """
+    return [
+        {'season': season, 'num_rooms': rooms, 'alpha': alpha, 'gamma': gamma, 'epsilon': epsilon, 'seed': seed}
+        for season, rooms, alpha, gamma, epsilon, seed
+        in itertools.product(seasons, num_rooms, alphas, gammas, epsilons, seeds)
+    ]
+
+
+def q_table_filename(scenario):
+    return (f"q_table_{scenario['season']}_rooms{scenario['num_rooms']}_alpha{scenario['alpha']}"
+            f"_gamma{scenario['gamma']}_epsilon{scenario['epsilon']}_seed{scenario['seed']}.npy")
+
+
+def run_scenario(scenario, episodes=2000, num_envs=1, num_households=100, output_dir='.'):
+    """
+    Train and evaluate one scenario. Runs inside a worker process of `run_sweep`.
+
+    Parameters:
+    - scenario: Dict with the keys season, num_rooms, alpha, gamma, epsilon and seed.
+    - episodes: Number of training episodes.
+    - num_envs: Number of parallel environments used for training.
+    - num_households: Size of the household population built by EnergyModel.
+    - output_dir: Directory where the trained Q-table is saved.
+
+    Returns:
+    - Dict with the scenario, the trained and random policy totals and the Q-table file name.
+    """
+    # Every scenario owns its random streams, so results do not depend on the worker that ran it
+    model = EnergyModel(num_households, scenario['num_rooms'], scenario['season'],
+                        alpha=scenario['alpha'], gamma=scenario['gamma'], epsilon=scenario['epsilon'],
+                        seed=scenario['seed'])
+    model.train_agent(episodes, num_envs=num_envs)
+
+    q_table_file = os.path.join(output_dir, q_table_filename(scenario))
+    model.q_learning_agent.save_q_table(q_table_file)
+
+    electricity_trained, gas_trained, cost_trained = model.test_agent_exploitation()
+    electricity_random, gas_random, cost_random = model.test_random_policy()
+
+    result = dict(scenario)
+    result.update({
+        'electricity_trained': float(electricity_trained),
+        'gas_trained': float(gas_trained),
+        'cost_trained': float(cost_trained),
+        'electricity_random': float(electricity_random),
+        'gas_random': float(gas_random),
+        'cost_random': float(cost_random),
+        'cost_reduction': float(cost_random - cost_trained),
+        'q_table_file': q_table_file,
+    })
+    return result
+
+
+def _run_scenario_job(job):
+    scenario, kwargs = job
+    return run_scenario(scenario, **kwargs)
+
+
+def run_sweep(scenarios, processes=None, **kwargs):
+    """
+    Run every scenario on a process pool and gather the results in scenario order.
+
+    Parameters:
+    - scenarios: List of scenario dicts, see `scenario_grid`.
+    - processes: Number of worker processes (defaults to the number of CPUs).
+    - kwargs: Extra keyword arguments passed to `run_scenario`.
+
+    Returns:
+    - List of result dicts, one per scenario.
+    """
+    jobs = [(scenario, kwargs) for scenario in scenarios]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_run_scenario_job, jobs))
+
+
+def write_results(results, filename):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Train and evaluate EnergyModel over a grid of scenarios.')
+    parser.add_argument('--seasons', nargs='+', choices=SEASONS, default=list(SEASONS))
+    parser.add_argument('--num-rooms', nargs='+', type=int, default=[3])
+    parser.add_argument('--alphas', nargs='+', type=float, default=[0.1])
+    parser.add_argument('--gammas', nargs='+', type=float, default=[0.95])
+    parser.add_argument('--epsilons', nargs='+', type=float, default=[0.05])
+    parser.add_argument('--seeds', nargs='+', type=int, default=[0])
+    parser.add_argument('--episodes', type=int, default=2000)
+    parser.add_argument('--num-envs', type=int, default=1)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--output-dir', default='.')
+    parser.add_argument('--results', default='sweep_results.csv')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = scenario_grid(args.seasons, args.num_rooms, args.alphas, args.gammas, args.epsilons, args.seeds)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    print(f"Running {len(scenarios)} scenarios...")
+    results = run_sweep(scenarios, processes=args.processes, episodes=args.episodes,
+                        num_envs=args.num_envs, output_dir=args.output_dir)
+    write_results(results, os.path.join(args.output_dir, args.results))
+
+    for result in results:
+        print(f"{result['season']:>6} rooms={result['num_rooms']} alpha={result['alpha']} gamma={result['gamma']} "
+              f"epsilon={result['epsilon']} seed={result['seed']}: "
+              f"cost £{result['cost_trained']:.2f} vs random £{result['cost_random']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import csv
+import hashlib
+from datetime import datetime
+
+import numpy as np
+
+# Electricity prices of the default two-rate tariff (pence per kWh)
+PEAK_PRICE = 24.50
+OFF_PEAK_PRICE = 22.36
+PEAK_HOURS = [(7, 17), (19, 23)]
+
+
+class Tariff:
+    def __init__(self, prices, name='custom'):
+        """
+        Electricity tariff as a precomputed price vector.
+
+        Parameters:
+        - prices: Prices in pence per kWh, either one day of slots with shape (slots_per_day,) or
+          several days with shape (days, slots_per_day). 24 slots per day are hourly prices, 48
+          slots are half-hourly prices as used by agile tariffs. The schedule repeats after the
+          last day.
+        - name: Name used to identify the tariff in results.
+        """
+        prices = np.atleast_2d(np.asarray(prices, dtype=np.float64))
+        if prices.shape[1] % 24 != 0:
+            raise ValueError("The number of price slots per day must be a multiple of 24")
+
+        self.name = name
+        self.prices = prices
+        self.slots_per_day = prices.shape[1]
+        self.num_days = prices.shape[0]
+
+        # Hourly price in £ per kWh for every hour of the schedule, half-hour slots are averaged
+        slots_per_hour = self.slots_per_day // 24
+        hourly = prices.reshape(self.num_days, 24, slots_per_hour).mean(axis=2) if slots_per_hour > 1 else prices
+        self.hourly_prices = (hourly / 100).reshape(-1)
+        self.hourly_prices.flags.writeable = False
+
+    @classmethod
+    def from_schedule(cls, rates, default, slots_per_day=24, name='custom'):
+        """
+        Build a daily tariff from a declarative schedule.
+
+        Parameters:
+        - rates: List of (start_hour, end_hour, price) tuples, hours may be fractional for
+          half-hourly schedules. Later entries override earlier ones.
+        - default: Price in pence per kWh outside of the scheduled windows.
+        - slots_per_day: 24 for hourly or 48 for half-hourly prices.
+        - name: Name used to identify the tariff in results.
+        """
+        slot_hours = np.arange(slots_per_day) * 24 / slots_per_day
+        prices = np.full(slots_per_day, default, dtype=np.float64)
+        for start, end, price in rates:
+            prices[(start <= slot_hours) & (slot_hours < end)] = price
+        return cls(prices, name=name)
+
+    @classmethod
+    def from_csv(cls, filename, name=None, slots_per_day=None, price_column='price', timestamp_column='timestamp'):
+        """
+        Load a dynamic tariff, such as an agile price file, from a local CSV file.
+
+        The file must have a header with a price column in pence per kWh, with one row per slot in
+        chronological order starting at midnight. The slot length is read from the first two ISO
+        timestamps of `timestamp_column` unless `slots_per_day` is given. Other columns are ignored.
+
+        Parameters:
+        - filename: Path to the CSV file.
+        - name: Name of the tariff, defaults to the file name.
+        - slots_per_day: 24 or 48, required when the file has no timestamp column.
+        - price_column: Name of the column holding the prices.
+        - timestamp_column: Name of the column holding the start time of every slot.
+        """
+        with open(filename, newline='') as f:
+            rows = list(csv.DictReader(f))
+        prices = np.array([float(row[price_column]) for row in rows], dtype=np.float64)
+
+        if slots_per_day is None:
+            if len(rows) < 2 or timestamp_column not in rows[0]:
+                raise ValueError(f"{filename} has no '{timestamp_column}' column, pass slots_per_day")
+            slot = (datetime.fromisoformat(rows[1][timestamp_column]) -
+                    datetime.fromisoformat(rows[0][timestamp_column]))
+            if slot.total_seconds() <= 0 or 86400 % slot.total_seconds() != 0:
+                raise ValueError(f"{filename} has slots of {slot}, which do not divide a day")
+            slots_per_day = int(86400 // slot.total_seconds())
+        if len(prices) == 0 or len(prices) % slots_per_day != 0:
+            raise ValueError(f"{filename} must contain whole days of {slots_per_day} prices")
+        return cls(prices.reshape(-1, slots_per_day), name=name or filename)
+
+    def fingerprint(self):
+        """
+        Return a short hash of the price schedule, used to key cached results by tariff.
+        """
+        return hashlib.sha256(self.prices.tobytes() + str(self.prices.shape).encode()).hexdigest()[:16]
+
+    def price_at(self, day, hour):
+        """
+        Return the electricity price in £ per kWh for the given day and hour. Works on scalars and arrays.
+        """
+        return self.hourly_prices[(day * 24 + hour) % len(self.hourly_prices)]
+
+
+def two_rate_tariff(peak_price=PEAK_PRICE, off_peak_price=OFF_PEAK_PRICE):
+    """
+    Default tariff: peak price from 7:00 to 17:00 and 19:00 to 23:00, off-peak price otherwise.
+    """
+    return Tariff.from_schedule([(start, end, peak_price) for start, end in PEAK_HOURS], off_peak_price,
+                                name='two_rate')
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from q_storage import SparseQTable
+
+
+def full_table():
+    # States 95 to 98 fill a table bounded to 4 rows, 96 and 97 being the least recently used
+    table = SparseQTable(num_actions=2, max_states=4)
+    table.add([96, 97], [0, 0], [-10.0, -5.0])
+    table.add([95, 98], [0, 0], [1.0, 2.0])
+    return table
+
+
+def test_batch_with_more_states_than_the_bound_is_rejected():
+    table = full_table()
+    with pytest.raises(ValueError):
+        table.add([96, 97, 98, 107, 108], [0, 0, 0, 0, 0], [-10.0, -10.0, -10.0, -10.0, -10.0])
+    assert table.rows([96, 97, 95, 98])[:, 0].tolist() == [-10.0, -5.0, 1.0, 2.0]
+
+
+def test_rows_of_the_current_update_are_not_evicted():
+    table = full_table()
+    # 96 and 97 are the least recently used rows, but this update touches them
+    table.add([96, 97, 107, 108], [0, 0, 0, 0], [-10.0, -10.0, -1.0, -1.0])
+
+    assert table.evictions == 2
+    assert sorted(table.index) == [96, 97, 107, 108]
+    np.testing.assert_array_equal(table.rows([96, 97, 107, 108])[:, 0], [-20.0, -15.0, -1.0, -1.0])
+    np.testing.assert_array_equal(table.rows([95, 98]), 0.0)